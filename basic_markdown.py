@@ -0,0 +1,88 @@
+import re
+
+# Fallback markdown conversion used when Gemini is unavailable. Each line is
+# classified once: it is lowercased at most once, its word count is capped
+# at what the heading rule needs, and every keyword test is a single
+# precompiled regex search instead of a Python-level scan over a list.
+
+HEADING_KEYWORD_RE = re.compile(
+    r'chapter|section|part|unit|lesson|introduction|conclusion|summary|overview'
+    r'|definition|theorem|principle|concept'
+)
+TOP_LEVEL_HEADING_RE = re.compile(r'chapter|unit|part')
+NUMBERED_ITEM_RE = re.compile(r'(\d+)\.?\s+(.*)')
+DEFINITION_RE = re.compile(r':| (?:is|are|means|refers to|defined as|=|equals|represents) ')
+MATH_INDICATOR_RE = re.compile(r'[=+\-×÷∑∫√^²³]')
+# '²' and '³' are already counted by str.isdigit
+MATH_SYMBOL_RE = re.compile(r'[=+\-×÷∑∫√^]')
+
+BULLET_MARKERS = frozenset('•◦▪▫‣-*')
+# Checked in this order, so "x: y is z" splits at " is " rather than ": "
+DEFINITION_SEPARATORS = (' is ', ' are ', ' means ', ' refers to ', ' defined as ', ': ')
+
+EXCESS_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n+')
+HEADING_LINE_RE = re.compile(r'\n(#{1,6}\s+[^\n]+)\n')
+BULLET_PAIR_RE = re.compile(r'\n(-\s+[^\n]+)\n(-\s+)')
+TRAILING_SPACES_RE = re.compile(r' +\n')
+
+
+def basic_text_to_markdown(text):
+    """Fallback basic markdown conversion"""
+    return clean_markdown_formatting('\n'.join([convert_line(line.strip()) for line in text.split('\n')]))
+
+
+def convert_line(line):
+    """Format one stripped line as a heading, bullet, numbered item, definition, formula or paragraph"""
+    if not line:
+        return ''
+    lower = line.lower()
+
+    # Headings: short lines with a heading keyword, all caps or a trailing colon.
+    # Splitting at most 6 times is enough to tell 5 and 6 words from more.
+    words = len(line.split(None, 6))
+    if words <= 6 and (
+        (words <= 5 and HEADING_KEYWORD_RE.search(lower)) or line.isupper() or line.endswith(':')
+    ):
+        heading = line.rstrip(':')
+        if TOP_LEVEL_HEADING_RE.search(heading.lower()):
+            return f"## {heading}"
+        return f"### {heading}"
+
+    if line[0] in BULLET_MARKERS:
+        return f"- {line[1:].strip()}"
+
+    match = NUMBERED_ITEM_RE.match(line)
+    if match:
+        return f"{match.group(1)}. {match.group(2)}"
+
+    if DEFINITION_RE.search(lower):
+        for separator in DEFINITION_SEPARATORS:
+            if separator in line:
+                term, definition = line.split(separator, 1)
+                return f"**{term.strip()}**{separator}{definition.strip()}"
+        return line
+
+    if MATH_INDICATOR_RE.search(line):
+        letters = sum(map(str.isalpha, line))
+        symbols = sum(map(str.isdigit, line)) + len(MATH_SYMBOL_RE.findall(line))
+        if letters < symbols:
+            return f"`{line}`"
+
+    return line
+
+
+def clean_markdown_formatting(text):
+    """Clean and improve markdown formatting"""
+    # Remove excessive blank lines
+    text = EXCESS_BLANK_LINES_RE.sub('\n\n', text)
+
+    # Ensure proper spacing around headings
+    text = HEADING_LINE_RE.sub(r'\n\n\1\n\n', text)
+
+    # Fix bullet point spacing
+    text = BULLET_PAIR_RE.sub(r'\n\1\n\2', text)
+
+    # Remove trailing spaces
+    text = TRAILING_SPACES_RE.sub('\n', text)
+
+    return text.strip()
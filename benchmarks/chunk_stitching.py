@@ -0,0 +1,84 @@
+"""Round-trip check for windowed correction/conversion (chunking.py).
+
+Splits documents into overlapping windows, runs every window through a
+fake model that echoes what it is given (optionally with small edits to
+each line, as a correction pass would make), stitches the outputs and
+checks the original lines come back once each, in order. Covers
+documents whose lines repeat, where matching the overlap to the wrong
+occurrence duplicates or drops lines.
+
+    python benchmarks/chunk_stitching.py
+"""
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chunking import map_windows, split_windows, strip_overlap  # noqa: E402
+from fakes import synthetic_text  # noqa: E402
+
+
+def echo(prompt_text):
+    return prompt_text
+
+
+def noisy_echo(prompt_text):
+    """Echo with an OCR-style fix in some lines, deterministic per line"""
+    lines = []
+    for line in prompt_text.split("\n"):
+        if line and random.Random(line).random() < 0.3:
+            line = line.replace("e", "é", 1)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+DOCUMENTS = {
+    "synthetic notes": synthetic_text(4000),
+    "one repeated line": "\n".join(["The same line of text."] * 2000),
+    "repeated pairs": "\n".join(["Entropy increases.", "Heat flows from hot to cold."] * 800),
+    "repeated blocks": "\n".join(
+        line for _ in range(150) for line in ("## Summary", "- energy is conserved", "- entropy grows", "")
+    ),
+    "numbered repeats": "\n".join(f"Step {i % 3}: apply the rule" for i in range(1500)),
+}
+
+# (window max tokens, overlap tokens)
+SETTINGS = [(300, 40), (1000, 100)]
+
+
+def check(name, text, convert, max_tokens, overlap_tokens):
+    windows = split_windows(text, max_tokens, overlap_tokens)
+    stitched, failed = map_windows(windows, convert, lambda window_text: window_text, max_workers=4)
+    expected = convert(text) if convert is not echo else text
+    expected_lines = [line for line in expected.split("\n") if line.strip()]
+    stitched_lines = [line for line in stitched.split("\n") if line.strip()]
+    ok = stitched_lines == expected_lines and not failed
+    print(f"{'ok' if ok else 'FAIL':>4}  {name:<18} {convert.__name__:<10} windows={len(windows):<3} "
+          f"lines {len(expected_lines)} -> {len(stitched_lines)}")
+    return ok
+
+
+def check_strip_overlap():
+    """The cut follows the whole overlap, not the first line resembling its last line"""
+    overlap = "a\nb\na"
+    output = "a\nb\na\nb\na\nc"
+    ok = strip_overlap(output, overlap) == "b\na\nc"
+    ok = ok and strip_overlap("x\ny\nz", overlap) == "x\ny\nz"
+    print(f"{'ok' if ok else 'FAIL':>4}  strip_overlap cases")
+    return ok
+
+
+def main():
+    results = [check_strip_overlap()]
+    for name, text in DOCUMENTS.items():
+        for convert in (echo, noisy_echo):
+            for max_tokens, overlap_tokens in SETTINGS:
+                results.append(check(name, text, convert, max_tokens, overlap_tokens))
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Upstream calls made by concurrent identical requests, with and without single-flight.
+
+Fires --clients identical requests at once (same PDF upload, same tutor
+question, same text to process) through the Flask test client against the
+fakes in benchmarks/fakes.py, once with SINGLE_FLIGHT_ENABLED=1 and once
+with 0, each in a fresh subprocess. Reports the Vision and Gemini calls
+that reached the fakes, the wall time, the calls the server coalesced,
+and whether every client got the same answer.
+
+    python benchmarks/coalescing.py --clients 16 --llm-latency 0.5
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeVisionClient, ReplayLLMBackend  # noqa: E402
+from pipeline import request_factory  # noqa: E402
+
+SCENARIOS = ["ocr", "chat", "process"]
+# Per-request identifiers that legitimately differ between clients
+VOLATILE_FIELDS = ("document_id", "timings")
+
+
+def run_single(args):
+    workdir = tempfile.mkdtemp(prefix="ylearn-coalesce-")
+    atexit.register(shutil.rmtree, workdir, True)
+    # Without the result cache every request that is not coalesced reaches the fakes
+    os.environ["RESULT_CACHE_ENABLED"] = "0"
+    os.environ.setdefault("DOCUMENT_STORE_PATH", os.path.join(workdir, "documents.sqlite3"))
+    os.environ.setdefault("GEMINI_RPM", "0")
+    os.environ.setdefault("GEMINI_TPM", "0")
+    os.environ.setdefault("QUIZ_BANK_SIZE", "0")
+
+    import server
+
+    vision = FakeVisionClient(args.vision_latency)
+    server.clients.set("vision", vision)
+    server.llm.backend = ReplayLLMBackend(args.llm_latency)
+
+    make_request = request_factory(args.single, args.words)
+    start_together = threading.Barrier(args.clients)
+
+    def send(_):
+        client = server.app.test_client()
+        path, kwargs = make_request()
+        start_together.wait()
+        response = client.post(path, **kwargs)
+        body = response.get_json(silent=True) or {}
+        for field in VOLATILE_FIELDS:
+            body.pop(field, None)
+        return response.status_code, json.dumps(body, sort_keys=True)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        outcomes = list(executor.map(send, range(args.clients)))
+    wall = time.perf_counter() - start
+
+    stages = server.in_flight.stats()["stages"]
+    print(json.dumps({
+        "errors": sum(1 for status, _ in outcomes if status >= 400),
+        "distinct_answers": len({body for _, body in outcomes}),
+        "vision_calls": vision.calls,
+        "llm_calls": server.llm.backend.calls,
+        "coalesced": sum(stats["coalesced"] for stats in stages.values()),
+        "wall": wall,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent identical requests")
+    parser.add_argument("--words", type=int, default=1000, help="document size in words")
+    parser.add_argument("--vision-latency", type=float, default=0.1, help="fake Vision latency per batch (seconds)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake Gemini latency per call (seconds)")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args)
+        return
+
+    print(f"{'scenario':>9} {'single-flight':>13} {'errors':>6} {'answers':>7} {'vision':>6} {'gemini':>6} "
+          f"{'coalesced':>9} {'wall s':>7}")
+    for scenario in args.scenarios:
+        for enabled in ("1", "0"):
+            command = [
+                sys.executable, __file__, "--single", scenario, "--clients", str(args.clients),
+                "--words", str(args.words), "--vision-latency", str(args.vision_latency),
+                "--llm-latency", str(args.llm_latency),
+            ]
+            env = dict(os.environ, SINGLE_FLIGHT_ENABLED=enabled)
+            output = subprocess.run(command, check=True, capture_output=True, text=True, env=env).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{scenario:>9} {'on' if enabled == '1' else 'off':>13} {result['errors']:>6} "
+                  f"{result['distinct_answers']:>7} {result['vision_calls']:>6} {result['llm_calls']:>6} "
+                  f"{result['coalesced']:>9} {result['wall']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Record/replay fakes for Vision and Gemini shared by the benchmarks.
+
+Replay clients answer from a fixture file of stored responses (keyed by a
+hash of the image bytes or the prompt) after a configurable latency, and
+fall back to synthetic but well-formed responses for anything that was
+not recorded, so every pipeline stage takes its success path offline.
+Recording clients wrap the real APIs and add what they see to the file.
+
+Fixture format: {"vision": {sha256: text}, "llm": {sha256: text}}
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import types
+
+WORDS = (
+    "entropy energy system heat transfer temperature equilibrium process reversible "
+    "irreversible cycle engine efficiency work pressure volume gas state function "
+    "boundary surroundings conduction convection radiation gradient flux law"
+).split()
+
+
+def synthetic_text(words, seed=0, section_words=250):
+    """Deterministic study-note text of about `words` words with markdown-style sections"""
+    rng = random.Random(seed)
+    lines = []
+    written = 0
+    section = 0
+    while written < words:
+        section += 1
+        lines.append(f"## Section {section}: {rng.choice(WORDS).title()} and {rng.choice(WORDS)}")
+        in_section = 0
+        while in_section < section_words and written < words:
+            length = rng.randint(8, 20)
+            sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+            lines.append(f"- {sentence.capitalize()}.")
+            in_section += length
+            written += length
+        lines.append("")
+    return "\n".join(lines)
+
+
+def build_pdf(pages, path=None):
+    """A scanned-style PDF (drawn shapes, no text layer) of the given page count.
+
+    Every page needs OCR. Saved to path if given, otherwise returned as bytes.
+    """
+    import fitz
+
+    document = fitz.open()
+    for page_number in range(max(1, pages)):
+        page = document.new_page()
+        for row in range(30):
+            y = 60 + row * 22
+            page.draw_rect(fitz.Rect(60, y, 60 + (page_number * 37 + row * 53) % 450, y + 12),
+                           color=(0, 0, 0), fill=(0.2, 0.2, 0.2))
+    try:
+        if path:
+            document.save(path)
+            return None
+        return document.tobytes()
+    finally:
+        document.close()
+
+
+def fixture_key(payload):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class Fixtures:
+    """Stored responses, loaded from and saved back to a JSON file"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.data = {"vision": {}, "llm": {}}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                stored = json.load(f)
+            for kind in self.data:
+                self.data[kind].update(stored.get(kind, {}))
+
+    def get(self, kind, key):
+        with self._lock:
+            return self.data[kind].get(key)
+
+    def put(self, kind, key, value):
+        with self._lock:
+            self.data[kind][key] = value
+
+    def save(self):
+        if not self.path:
+            return
+        # Merge with whatever other benchmark processes saved meanwhile
+        with self._lock:
+            merged = Fixtures(self.path).data
+            for kind, values in self.data.items():
+                merged[kind].update(values)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(merged, f)
+
+
+def _vision_response(text):
+    return types.SimpleNamespace(
+        error=types.SimpleNamespace(message=""),
+        full_text_annotation=types.SimpleNamespace(text=text),
+    )
+
+
+class FakeVisionClient:
+    """Answers batch_annotate_images from fixtures (or synthetic page text) after a fixed delay"""
+
+    def __init__(self, latency=0.02, fixtures=None, words_per_page=250):
+        self.latency = latency
+        self.fixtures = fixtures or Fixtures()
+        self.words_per_page = words_per_page
+        self.calls = 0
+
+    def batch_annotate_images(self, requests):
+        self.calls += 1
+        time.sleep(self.latency)
+        responses = []
+        for request in requests:
+            content = request.image.content
+            key = fixture_key(content)
+            text = self.fixtures.get("vision", key)
+            if text is None:
+                text = synthetic_text(self.words_per_page, seed=int(key[:8], 16))
+            responses.append(_vision_response(text))
+        return types.SimpleNamespace(responses=responses)
+
+
+class RecordingVisionClient:
+    """Wraps a real ImageAnnotatorClient and stores every page's text in fixtures"""
+
+    def __init__(self, client, fixtures):
+        self.client = client
+        self.fixtures = fixtures
+
+    def batch_annotate_images(self, requests):
+        response = self.client.batch_annotate_images(requests=requests)
+        for request, image_response in zip(requests, response.responses):
+            if not image_response.error.message:
+                text = image_response.full_text_annotation.text if image_response.full_text_annotation else ""
+                self.fixtures.put("vision", fixture_key(request.image.content), text)
+        return response
+
+
+def synthetic_llm_response(prompt):
+    """A well-formed answer for whichever server prompt this is"""
+    if "AI tutor" in prompt:
+        return "Here is an explanation based on your study material. " * 8
+    if "Create three study artifacts" in prompt:
+        return json.dumps({
+            "bullets": [f"Key point {i} about {WORDS[i]}" for i in range(6)],
+            "flashcards": [{"question": f"What is {WORDS[i]}?", "answer": f"{WORDS[i]} is covered in the notes"} for i in range(6)],
+            "mindmap": {"central_topic": "Notes", "branches": [
+                {"name": f"Section {i}", "sub_branches": [WORDS[i], WORDS[i + 1]]} for i in range(4)
+            ]},
+        })
+    if "JSON array of strings" in prompt:
+        return json.dumps([f"Key point {i} about {WORDS[i]}" for i in range(6)])
+    if "flashcards" in prompt.lower() and "Return ONLY a JSON array" in prompt:
+        return json.dumps([{"question": f"What is {WORDS[i]}?", "answer": f"{WORDS[i]} is covered in the notes"} for i in range(6)])
+    if "mind map" in prompt.lower():
+        return json.dumps({"central_topic": "Notes", "branches": [
+            {"name": f"Section {i}", "sub_branches": [WORDS[i], WORDS[i + 1]]} for i in range(4)
+        ]})
+    if "quiz" in prompt.lower() or "questions based EXCLUSIVELY" in prompt:
+        return json.dumps([{
+            "type": "mcq",
+            "difficulty": "easy",
+            "question": f"What does the material say about {WORDS[i]}?",
+            "options": ["A) It is defined", "B) It is not covered", "C) It is optional", "D) It is obsolete"],
+            "correct_answer": "A",
+            "explanation": "The material defines it.",
+        } for i in range(10)])
+    # Correction and markdown conversion echo the text they were given
+    # (the closing marker is the last one: the text may contain "--- Page N ---" lines)
+    marker = "---\n"
+    start = prompt.find(marker)
+    end = prompt.rfind("\n" + marker)
+    if start >= 0 and end > start:
+        return prompt[start + len(marker):end].strip()
+    return "Here is a response based on your study material."
+
+
+class ReplayLLMBackend:
+    """llm_client backend answering from fixtures (or synthetic responses) after a fixed delay"""
+
+    def __init__(self, latency=0.5, fixtures=None):
+        self.latency = latency
+        self.fixtures = fixtures or Fixtures()
+        self.calls = 0
+
+    def generate(self, model, prompt, generation_config=None, timeout=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        text = self.fixtures.get("llm", fixture_key(prompt))
+        return text if text is not None else synthetic_llm_response(prompt)
+
+    def stream(self, model, prompt, generation_config=None, timeout=None):
+        text = self.generate(model, prompt, generation_config, timeout)
+        for start in range(0, len(text), 40):
+            yield text[start:start + 40]
+
+
+class RecordingLLMBackend:
+    """Wraps a real llm_client backend and stores every response in fixtures"""
+
+    def __init__(self, backend, fixtures):
+        self.backend = backend
+        self.fixtures = fixtures
+
+    def generate(self, model, prompt, generation_config=None, timeout=None):
+        text = self.backend.generate(model, prompt, generation_config, timeout)
+        self.fixtures.put("llm", fixture_key(prompt), text)
+        return text
+
+    def stream(self, model, prompt, generation_config=None, timeout=None):
+        chunks = []
+        for chunk in self.backend.stream(model, prompt, generation_config, timeout):
+            chunks.append(chunk)
+            yield chunk
+        self.fixtures.put("llm", fixture_key(prompt), "".join(chunks))
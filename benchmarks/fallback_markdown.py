@@ -0,0 +1,295 @@
+"""Golden check and throughput benchmark for the fallback markdown converter.
+
+basic_markdown.basic_text_to_markdown replaced a per-line chain of
+is_*/format_as_* helpers that rebuilt keyword lists and rescanned each
+line. The original helpers are kept below, verbatim, as the reference:
+this script first checks that both produce identical output on edge cases
+and on randomized lines, then times both on multi-MB inputs.
+
+    python benchmarks/fallback_markdown.py --sizes-mb 1 4 --fuzz 20000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import basic_markdown  # noqa: E402
+from fakes import synthetic_text  # noqa: E402
+
+# ---- reference implementation (server.py before the compiled classifier) ----
+
+def basic_text_to_markdown(text):
+    """Fallback basic markdown conversion"""
+    lines = text.split('\n')
+    markdown_lines = []
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            markdown_lines.append('')
+            continue
+
+        # Detect and format different types of content
+        if is_heading(line):
+            markdown_lines.append(format_as_heading(line))
+        elif is_bullet_point(line):
+            markdown_lines.append(format_as_bullet(line))
+        elif is_numbered_item(line):
+            markdown_lines.append(format_as_numbered_item(line))
+        elif is_definition(line):
+            markdown_lines.append(format_as_definition(line))
+        elif is_formula_or_equation(line):
+            markdown_lines.append(format_as_code_block(line))
+        else:
+            # Regular paragraph
+            markdown_lines.append(line)
+
+    return clean_markdown_formatting('\n'.join(markdown_lines))
+
+
+def clean_markdown_formatting(text):
+    """Clean and improve markdown formatting"""
+    # Remove excessive blank lines
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+
+    # Ensure proper spacing around headings
+    text = re.sub(r'\n(#{1,6}\s+[^\n]+)\n', r'\n\n\1\n\n', text)
+
+    # Fix bullet point spacing
+    text = re.sub(r'\n(-\s+[^\n]+)\n(-\s+)', r'\n\1\n\2', text)
+
+    # Remove trailing spaces
+    text = re.sub(r' +\n', '\n', text)
+
+    return text.strip()
+
+
+def is_heading(line):
+    """Detect if a line should be formatted as a heading"""
+    heading_indicators = [
+        'chapter', 'section', 'part', 'unit', 'lesson',
+        'introduction', 'conclusion', 'summary', 'overview',
+        'definition', 'theorem', 'principle', 'concept'
+    ]
+
+    line_lower = line.lower()
+
+    # Short lines that might be titles
+    if len(line.split()) <= 5 and any(indicator in line_lower for indicator in heading_indicators):
+        return True
+
+    # Lines that are all caps (likely headings)
+    if line.isupper() and len(line.split()) <= 6:
+        return True
+
+    # Lines ending with colons (might be section headers)
+    if line.endswith(':') and len(line.split()) <= 6:
+        return True
+
+    return False
+
+
+def format_as_heading(line):
+    """Format line as markdown heading"""
+    line = line.rstrip(':')  # Remove trailing colon if present
+
+    # Determine heading level based on content
+    if any(word in line.lower() for word in ['chapter', 'unit', 'part']):
+        return f"## {line}"
+    else:
+        return f"### {line}"
+
+
+def is_bullet_point(line):
+    """Detect if line is a bullet point"""
+    bullet_markers = ['•', '◦', '▪', '▫', '‣', '-', '*']
+    return any(line.startswith(marker) for marker in bullet_markers)
+
+
+def format_as_bullet(line):
+    """Format as proper markdown bullet"""
+    for marker in ['•', '◦', '▪', '▫', '‣', '-', '*']:
+        if line.startswith(marker):
+            line = line[1:].strip()
+            break
+    return f"- {line}"
+
+
+def is_numbered_item(line):
+    """Detect numbered list items"""
+    return bool(re.match(r'^\d+\.?\s+', line))
+
+
+def format_as_numbered_item(line):
+    """Format numbered items properly"""
+    match = re.match(r'^(\d+)\.?\s+(.*)', line)
+    if match:
+        number, content = match.groups()
+        return f"{number}. {content}"
+    return line
+
+
+def is_definition(line):
+    """Detect definition patterns"""
+    definition_patterns = [
+        ' is ', ' are ', ' means ', ' refers to ', ' defined as ',
+        ':', ' = ', ' equals ', ' represents '
+    ]
+    return any(pattern in line.lower() for pattern in definition_patterns)
+
+
+def format_as_definition(line):
+    """Format definitions with emphasis"""
+    separators = [' is ', ' are ', ' means ', ' refers to ', ' defined as ', ': ']
+
+    for sep in separators:
+        if sep in line.lower():
+            parts = line.split(sep, 1)
+            if len(parts) == 2:
+                term = parts[0].strip()
+                definition = parts[1].strip()
+                return f"**{term}**{sep}{definition}"
+
+    return line
+
+
+def is_formula_or_equation(line):
+    """Detect mathematical formulas or equations"""
+    math_indicators = ['=', '+', '-', '×', '÷', '∑', '∫', '√', '^', '²', '³']
+    return any(indicator in line for indicator in math_indicators) and len([c for c in line if c.isalpha()]) < len([c for c in line if c.isdigit() or c in math_indicators])
+
+
+def format_as_code_block(line):
+    """Format as inline code or code block"""
+    return f"`{line}`"
+
+
+# ---- inputs ----
+
+GOLDEN_LINES = [
+    "", "   ", "\t", "CHAPTER 1: THERMODYNAMICS", "Chapter 2", "Unit Overview", "Part B:", "Summary",
+    "introduction to entropy and heat transfer in closed systems", "THE FIRST LAW", "KEY TERMS:",
+    "Notes for this week:", "A very long line that ends with a colon but has many words:",
+    "• first bullet", "◦  nested bullet", "▪x", "▫ y", "‣ z", "- dash", "* star", "-", "*", "-Chapter 3",
+    "1. First item", "2 Second item", "3.Third", "10.   spaced   out", "4.\tTabbed", "5", "12 ",
+    "Entropy is a measure of disorder", "ENTROPY IS DISORDER and more words here", "Work means force times distance",
+    "Heat refers to energy in transit here", "Temperature defined as average kinetic energy of molecules",
+    "Pressure: force per unit area of a surface", "ratio:value and more and more words", "x = y + z for all",
+    "Energy equals mass times c squared", "Q represents heat added to the system overall",
+    "Force: mass is the thing that is accelerated", "Gas Are Compressible In Most Cases Overall Here",
+    "E = mc²", "2 + 2 = 4", "a^2 + b^2 = c^2", "∑ x_i", "∫ f(x) dx = 1", "√16 = 4", "3 × 4 ÷ 2", "x²+y³",
+    "10 - 5", "½ + ¼", "Ⅻ + Ⅳ", "F=ma", "V=IR", "PV=nRT", "dS >= dQ/T", "1+1", "a+b", "H₂O + CO₂",
+    "İstanbul is a city in Türkiye on the Bosphorus", "ΣΟΦΟΣ", "Straße is German for street here",
+    "KELVIN SCALE", "Ångström is a unit of length used here", "café means coffee shop in French",
+    "line with trailing spaces    ", " non-breaking space line ", "tab\tseparated\tvalues here",
+    "carriage return\r", "## Already a heading", "### Section 3.1", "--- Page 2 ---", "> quote line",
+    "`code`", "**bold** text", "1) Paren item", "(a) lettered item", "i. roman item", "Q: What is entropy?",
+    "A: A measure of disorder.", "Note: see page 4", "e.g. conduction", "3.14159", "100%",
+]
+
+TOKENS = (
+    "chapter section part unit lesson introduction conclusion summary overview definition theorem "
+    "principle concept Chapter UNIT Part is are means refers to defined as equals represents IS Means "
+    "entropy heat work energy the a of and in x y z E F V Q"
+).split() + [
+    ":", "=", "+", "-", "×", "÷", "∑", "∫", "√", "^", "²", "³", "1", "2", "10", "3.", "42", "½", "Ⅻ",
+    "•", "◦", "▪", "▫", "‣", "*", "İ", "Σ", "ß", "K", "(", ")", "#", "##",
+]
+SEPARATORS = [" ", " ", " ", "", "  ", "\t", " ", "\r"]
+
+
+def fuzz_lines(count, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(1, 12)):
+            parts.append(rng.choice(TOKENS))
+            parts.append(rng.choice(SEPARATORS))
+        line = "".join(parts)
+        if rng.random() < 0.3:
+            line = line.upper()
+        if rng.random() < 0.2:
+            line = " " * rng.randint(1, 3) + line
+        lines.append(line)
+    return lines
+
+
+def document(size_bytes, seed=0):
+    """OCR-like study notes: headings, bullets, definitions, formulas and paragraphs"""
+    rng = random.Random(seed)
+    blocks = [synthetic_text(400, seed=seed)]
+    blocks.extend(GOLDEN_LINES)
+    blocks.extend(fuzz_lines(200, seed=seed))
+    text = "\n".join(blocks)
+    parts = []
+    length = 0
+    while length < size_bytes:
+        rng.shuffle(blocks)
+        chunk = "\n".join(blocks)
+        parts.append(chunk)
+        length += len(chunk.encode("utf-8"))
+    return "\n".join(parts) if parts else text
+
+
+# ---- checks ----
+
+def golden_check(fuzz_count):
+    failures = []
+    for line in GOLDEN_LINES + fuzz_lines(fuzz_count):
+        expected = basic_text_to_markdown(line)
+        actual = basic_markdown.basic_text_to_markdown(line)
+        if expected != actual:
+            failures.append((line, expected, actual))
+
+    text = document(200_000, seed=1)
+    if basic_text_to_markdown(text) != basic_markdown.basic_text_to_markdown(text):
+        failures.append(("<200 KB document>", "", ""))
+    for text in ("foo\n\n\n\nbar  \n- a\n- b\n# h\nx", "\n\n\n", "# x\n# y\n", "- a\n\n- b\n-c"):
+        if clean_markdown_formatting(text) != basic_markdown.clean_markdown_formatting(text):
+            failures.append((text, clean_markdown_formatting(text), basic_markdown.clean_markdown_formatting(text)))
+    return failures
+
+
+def best_time(func, text, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4])
+    parser.add_argument("--fuzz", type=int, default=20000, help="randomized lines for the golden check")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    failures = golden_check(args.fuzz)
+    for line, expected, actual in failures[:10]:
+        print(f"MISMATCH {line!r}\n  reference: {expected!r}\n  compiled:  {actual!r}")
+    if failures:
+        sys.exit(f"{len(failures)} golden mismatches")
+    print(f"golden: {len(GOLDEN_LINES) + args.fuzz} lines identical")
+
+    print(f"{'size MB':>8} {'lines':>8} {'reference s':>12} {'compiled s':>11} {'ref MB/s':>9} {'new MB/s':>9} {'speedup':>8}")
+    for size_mb in args.sizes_mb:
+        text = document(int(size_mb * 1024 * 1024))
+        megabytes = len(text.encode("utf-8")) / 1024 / 1024
+        if basic_text_to_markdown(text) != basic_markdown.basic_text_to_markdown(text):
+            sys.exit(f"output differs on the {size_mb} MB document")
+        reference = best_time(basic_text_to_markdown, text, args.repeats)
+        compiled = best_time(basic_markdown.basic_text_to_markdown, text, args.repeats)
+        print(f"{megabytes:>8.2f} {text.count(chr(10)) + 1:>8} {reference:>12.3f} {compiled:>11.3f} "
+              f"{megabytes / reference:>9.1f} {megabytes / compiled:>9.1f} {reference / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
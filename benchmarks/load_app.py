@@ -0,0 +1,29 @@
+"""WSGI entry point for load tests: the real server app with Vision and Gemini faked.
+
+    gunicorn --config gunicorn.conf.py --pythonpath benchmarks load_app:app
+
+LOAD_VISION_LATENCY and LOAD_LLM_LATENCY (seconds) set the fake upstream
+latencies; LOAD_FIXTURES replays recorded responses.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeVisionClient, Fixtures, ReplayLLMBackend  # noqa: E402
+
+# The client-side Gemini rate limit would cap the load the fakes can absorb
+os.environ.setdefault("GEMINI_RPM", "0")
+os.environ.setdefault("GEMINI_TPM", "0")
+os.environ.setdefault("RESULT_CACHE_ENABLED", "0")
+os.environ.setdefault("SINGLE_FLIGHT_ENABLED", "0")
+
+fixtures = Fixtures(os.getenv("LOAD_FIXTURES"))
+
+import server  # noqa: E402
+
+server.clients.set("vision", FakeVisionClient(float(os.getenv("LOAD_VISION_LATENCY", "1.0")), fixtures))
+server.llm.backend = ReplayLLMBackend(float(os.getenv("LOAD_LLM_LATENCY", "2.0")), fixtures)
+
+app = server.app
@@ -0,0 +1,116 @@
+"""Load test for the production serving mode.
+
+Starts gunicorn with gunicorn.conf.py on the fake-upstream app in
+benchmarks/load_app.py, then fires bursts of concurrent /api/chat requests
+whose (fake) Gemini call takes --llm-latency seconds. If upstream waits
+are overlapped, each burst finishes in about one upstream latency no
+matter how many requests it holds, on just --workers processes.
+
+    python benchmarks/load_test.py --workers 2 --threads 64 --concurrency 16 64 128
+"""
+import argparse
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import synthetic_text  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url + "/api/stats", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start within {timeout}s")
+
+
+def percentile(sorted_values, p):
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def post_chat(url, body):
+    request = urllib.request.Request(url + "/api/chat", data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            ok = response.status == 200
+    except OSError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 128])
+    parser.add_argument("--llm-latency", type=float, default=2.0, help="fake Gemini latency per call (seconds)")
+    parser.add_argument("--words", type=int, default=2000, help="study material size in words")
+    args = parser.parse_args()
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    workdir = tempfile.mkdtemp(prefix="ylearn-load-")
+    env = dict(
+        os.environ,
+        PORT=str(port), HOST="127.0.0.1",
+        WEB_WORKERS=str(args.workers), WEB_THREADS=str(args.threads), WEB_WORKER_CLASS=args.worker_class,
+        WEB_ACCESS_LOG="", LOAD_LLM_LATENCY=str(args.llm_latency),
+        DOCUMENT_STORE_PATH=os.path.join(workdir, "documents.sqlite3"),
+        # Every client asks the same question; coalesced, a burst would make
+        # one upstream call and measure single-flight instead of the workers
+        SINGLE_FLIGHT_ENABLED="0",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", os.path.join(ROOT, "gunicorn.conf.py"),
+         "--chdir", ROOT, "--pythonpath", os.path.join(ROOT, "benchmarks"), "load_app:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_server(url)
+        body = json.dumps({
+            "question": "How does entropy relate to heat transfer?", "context": synthetic_text(args.words),
+        }).encode("utf-8")
+        post_chat(url, body)  # warm up every lazily started component
+
+        print(f"{args.workers} x {args.worker_class} workers, {args.threads} threads each, "
+              f"upstream latency {args.llm_latency:.1f}s")
+        print(f"{'concurrent':>10} {'ok':>5} {'wall s':>7} {'p50 s':>7} {'p95 s':>7} {'req/s':>7}")
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                outcomes = list(executor.map(lambda _: post_chat(url, body), range(concurrency)))
+            wall = time.perf_counter() - start
+            latencies = sorted(seconds for seconds, _ in outcomes)
+            ok = sum(1 for _, success in outcomes if success)
+            print(f"{concurrency:>10} {ok:>5} {wall:>7.2f} {percentile(latencies, 50):>7.2f} "
+                  f"{percentile(latencies, 95):>7.2f} {concurrency / wall:>7.1f}")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
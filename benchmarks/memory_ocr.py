@@ -0,0 +1,73 @@
+"""Peak-memory benchmark for the PDF OCR pipeline.
+
+Builds synthetic scanned-style PDFs (no text layer) of increasing page
+counts and runs process_pdf on each in a fresh subprocess against a fake
+Vision client, reporting peak RSS. With the bounded page pipeline the peak
+should stay roughly flat as the page count grows.
+
+    python benchmarks/memory_ocr.py --pages 50 150 300
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeVisionClient, build_pdf  # noqa: E402
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_single(pdf_path, latency):
+    os.environ.setdefault("RESULT_CACHE_ENABLED", "0")
+    os.environ.setdefault("PDF_USE_TEXT_LAYER", "0")
+
+    # The server imports these lazily; load them first so they are not counted as growth
+    import fitz  # noqa: F401
+    from google.cloud import vision  # noqa: F401
+    import server
+    server.clients.set("vision", FakeVisionClient(latency))
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    text, pages = server.process_pdf(pdf_path)
+    elapsed = time.perf_counter() - start
+    print(f"{len(pages)} {elapsed:.3f} {baseline:.1f} {peak_rss_mb():.1f} {len(text)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 150, 300])
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Vision latency per batch (seconds)")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args.single, args.latency)
+        return
+
+    print(f"{'pages':>6} {'seconds':>8} {'import MB':>10} {'peak MB':>8} {'growth MB':>10} {'text chars':>11}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for pages in args.pages:
+            pdf_path = os.path.join(workdir, f"synthetic-{pages}.pdf")
+            build_pdf(pages, pdf_path)
+            output = subprocess.run(
+                [sys.executable, __file__, "--single", pdf_path, "--latency", str(args.latency)],
+                check=True, capture_output=True, text=True,
+            ).stdout.split()
+            count, seconds, baseline, peak, chars = output[-5:]
+            growth = float(peak) - float(baseline)
+            print(f"{count:>6} {float(seconds):>8.2f} {float(baseline):>10.1f} {float(peak):>8.1f} {growth:>10.1f} {chars:>11}")
+
+
+if __name__ == "__main__":
+    main()
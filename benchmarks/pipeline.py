@@ -0,0 +1,177 @@
+"""End-to-end latency benchmark for the HTTP endpoints.
+
+Drives /api/ocr, /api/process-corrected-text, /api/generate-quiz,
+/api/chat and /api/process-notes through the Flask test client at several
+document sizes and concurrency levels, with Vision and Gemini replaced by
+the record/replay fakes in benchmarks/fakes.py. Every scenario runs in a
+fresh subprocess and reports p50/p95 latency, throughput and peak RSS.
+
+    python benchmarks/pipeline.py --sizes 500 5000 --concurrency 1 4
+    python benchmarks/pipeline.py --fixtures fixtures.json   # replay recorded responses
+    python benchmarks/pipeline.py --record fixtures.json     # call the real APIs and store them
+
+Without fixtures the fakes synthesize well-formed responses, so results
+measure the server's own overhead plus the configured fake latencies.
+"""
+import argparse
+import atexit
+import io
+import json
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import (  # noqa: E402
+    FakeVisionClient, Fixtures, RecordingLLMBackend, RecordingVisionClient, ReplayLLMBackend, build_pdf,
+    synthetic_text,
+)
+
+ENDPOINTS = ["ocr", "process", "quiz", "chat", "notes"]
+WORDS_PER_PAGE = 250
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def request_factory(endpoint, words):
+    """Return a function producing (path, test-client kwargs) for one request"""
+    text = synthetic_text(words)
+
+    if endpoint == "ocr":
+        pdf = build_pdf(math.ceil(words / WORDS_PER_PAGE))
+        return lambda: ("/api/ocr", {
+            "data": {"file": (io.BytesIO(pdf), "notes.pdf")}, "content_type": "multipart/form-data",
+        })
+    if endpoint == "process":
+        return lambda: ("/api/process-corrected-text", {"json": {"text": text, "title": "Benchmark"}})
+    if endpoint == "quiz":
+        return lambda: ("/api/generate-quiz", {"json": {"context": text, "quiz_type": "mcq", "num_questions": 5}})
+    if endpoint == "chat":
+        return lambda: ("/api/chat", {"json": {"question": "How does entropy relate to heat transfer?", "context": text}})
+    if endpoint == "notes":
+        notes = json.dumps({"title": "Benchmark", "content": text.splitlines()}).encode("utf-8")
+        return lambda: ("/api/process-notes", {
+            "data": {"file": (io.BytesIO(notes), "notes.json")}, "content_type": "multipart/form-data",
+        })
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+def run_single(args):
+    workdir = tempfile.mkdtemp(prefix="ylearn-bench-")
+    atexit.register(shutil.rmtree, workdir, True)
+    os.environ.setdefault("RESULT_CACHE_ENABLED", "0")
+    os.environ.setdefault("DOCUMENT_STORE_PATH", os.path.join(workdir, "documents.sqlite3"))
+    # Client-side Gemini rate limits would measure the limiter, not the server
+    os.environ.setdefault("GEMINI_RPM", "0")
+    os.environ.setdefault("GEMINI_TPM", "0")
+    # Background question-bank fills after each processed document would add
+    # unrelated load to the process scenarios
+    os.environ.setdefault("QUIZ_BANK_SIZE", "0")
+
+    fixtures = Fixtures(args.record or args.fixtures)
+
+    import server
+
+    if args.record:
+        server.clients.set("vision", RecordingVisionClient(server.clients.get("vision"), fixtures))
+        server.llm.backend = RecordingLLMBackend(server.llm.backend, fixtures)
+    else:
+        server.clients.set("vision", FakeVisionClient(args.vision_latency, fixtures, WORDS_PER_PAGE))
+        server.llm.backend = ReplayLLMBackend(args.llm_latency, fixtures)
+
+    make_request = request_factory(args.single, args.words)
+    local = threading.local()
+
+    def send(_):
+        if not hasattr(local, "client"):
+            local.client = server.app.test_client()
+        path, kwargs = make_request()
+        start = time.perf_counter()
+        response = local.client.post(path, **kwargs)
+        response.get_data()
+        return time.perf_counter() - start, response.status_code
+
+    send(None)  # warm-up: imports, SQLite schema, lazily started workers
+    baseline = peak_rss_mb()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(send, range(args.requests)))
+    wall = time.perf_counter() - start
+
+    if args.record:
+        fixtures.save()
+    latencies = sorted(seconds for seconds, _ in outcomes)
+    print(json.dumps({
+        "errors": sum(1 for _, status in outcomes if status >= 400),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "throughput": len(outcomes) / wall if wall else 0.0,
+        "baseline_mb": baseline,
+        "peak_mb": peak_rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5000, 20000], help="document sizes in words")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--requests", type=int, default=12, help="requests per scenario")
+    parser.add_argument("--vision-latency", type=float, default=0.1, help="fake Vision latency per batch (seconds)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake Gemini latency per call (seconds)")
+    parser.add_argument("--fixtures", help="JSON file of recorded responses to replay")
+    parser.add_argument("--record", help="call the real APIs and store their responses in this JSON file")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    parser.add_argument("--words", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        args.concurrency = args.concurrency[0]
+        run_single(args)
+        return
+
+    print(f"{'endpoint':>9} {'words':>6} {'conc':>5} {'reqs':>5} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'req/s':>7} {'peak MB':>8} {'growth MB':>10}")
+    for endpoint in args.endpoints:
+        for words in args.sizes:
+            for concurrency in args.concurrency:
+                command = [
+                    sys.executable, __file__, "--single", endpoint, "--words", str(words),
+                    "--concurrency", str(concurrency), "--requests", str(args.requests),
+                    "--vision-latency", str(args.vision_latency), "--llm-latency", str(args.llm_latency),
+                ]
+                if args.fixtures:
+                    command += ["--fixtures", args.fixtures]
+                if args.record:
+                    command += ["--record", args.record]
+                output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{endpoint:>9} {words:>6} {concurrency:>5} {args.requests:>5} {result['errors']:>6} "
+                      f"{result['p50'] * 1000:>8.1f} {result['p95'] * 1000:>8.1f} {result['throughput']:>7.2f} "
+                      f"{result['peak_mb']:>8.1f} {result['peak_mb'] - result['baseline_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
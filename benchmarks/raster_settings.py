@@ -0,0 +1,108 @@
+"""Compare page rasterization settings for OCR.
+
+For every PDF in a corpus directory, each page is rendered with a grid of
+settings (pixel budget, grayscale/color, PNG/JPEG quality) and the script
+reports the bytes that would be sent to Vision and the render+encode time.
+With --vision it also OCRs every rendering with the real Vision API and
+reports character accuracy against the ground truth, which is either a
+sidecar <name>.txt (pages separated by form feeds) or the PDF's own text
+layer for born-digital documents.
+
+    python benchmarks/raster_settings.py corpus/ [--vision] [--max-pages 5]
+"""
+import argparse
+import difflib
+import glob
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SETTINGS = [
+    # (label, target_pixels, grayscale, format, jpeg_quality)
+    ("fixed-2x-color-png", None, False, "png", None),
+    ("2MP-gray-png", 2_000_000, True, "png", None),
+    ("2MP-gray-jpeg90", 2_000_000, True, "jpeg", 90),
+    ("2MP-gray-jpeg75", 2_000_000, True, "jpeg", 75),
+    ("1MP-gray-jpeg85", 1_000_000, True, "jpeg", 85),
+    ("4MP-gray-jpeg85", 4_000_000, True, "jpeg", 85),
+]
+
+
+def load_ground_truth(pdf_path, document):
+    sidecar = os.path.splitext(pdf_path)[0] + ".txt"
+    if os.path.exists(sidecar):
+        with open(sidecar, encoding="utf-8") as f:
+            return f.read().split("\f")
+    return [page.get_text() for page in document]
+
+
+def char_accuracy(expected, actual):
+    """Similarity of whitespace-normalized texts, 0..1"""
+    expected = " ".join(expected.split())
+    actual = " ".join(actual.split())
+    if not expected:
+        return 1.0 if not actual else 0.0
+    return difflib.SequenceMatcher(None, expected, actual, autojunk=False).ratio()
+
+
+def render(server, fitz, page, target_pixels, grayscale, image_format, jpeg_quality):
+    if target_pixels is None:
+        # The original fixed renderer: 2x zoom, full color PNG
+        return page.get_pixmap(matrix=fitz.Matrix(2.0, 2.0)).tobytes("png")
+    return server.render_page_image(page, target_pixels=target_pixels, grayscale=grayscale,
+                                    image_format=image_format, jpeg_quality=jpeg_quality)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="directory of PDFs")
+    parser.add_argument("--vision", action="store_true", help="OCR with the real Vision API and report accuracy")
+    parser.add_argument("--max-pages", type=int, default=10, help="pages per document")
+    args = parser.parse_args()
+
+    os.environ.setdefault("RESULT_CACHE_ENABLED", "0")
+    import fitz
+    from google.cloud import vision
+    import server
+
+    client = server.clients.get("vision") if args.vision else None
+
+    rows = {label: {"bytes": [], "seconds": [], "accuracy": []} for label, *_ in SETTINGS}
+    pdf_paths = sorted(glob.glob(os.path.join(args.corpus, "*.pdf")))
+    if not pdf_paths:
+        parser.error(f"no PDFs found in {args.corpus}")
+
+    for pdf_path in pdf_paths:
+        document = fitz.open(pdf_path)
+        truth = load_ground_truth(pdf_path, document)
+        for page_number in range(min(len(document), args.max_pages)):
+            page = document.load_page(page_number)
+            for label, target_pixels, grayscale, image_format, jpeg_quality in SETTINGS:
+                start = time.perf_counter()
+                img_data = render(server, fitz, page, target_pixels, grayscale, image_format, jpeg_quality)
+                rows[label]["seconds"].append(time.perf_counter() - start)
+                rows[label]["bytes"].append(len(img_data))
+
+                if client is not None:
+                    response = client.document_text_detection(image=vision.Image(content=img_data))
+                    text = response.full_text_annotation.text if response.full_text_annotation else ""
+                    expected = truth[page_number] if page_number < len(truth) else ""
+                    rows[label]["accuracy"].append(char_accuracy(expected, text))
+        document.close()
+
+    print(f"{'setting':<22} {'avg KB':>8} {'p95 KB':>8} {'avg ms':>8} {'accuracy':>9}")
+    for label, *_ in SETTINGS:
+        row = rows[label]
+        sizes = sorted(row["bytes"])
+        p95 = sizes[min(len(sizes) - 1, int(len(sizes) * 0.95))]
+        accuracy = f"{statistics.mean(row['accuracy']):.4f}" if row["accuracy"] else "-"
+        print(f"{label:<22} {statistics.mean(sizes) / 1024:>8.1f} {p95 / 1024:>8.1f} "
+              f"{statistics.mean(row['seconds']) * 1000:>8.1f} {accuracy:>9}")
+
+
+if __name__ == "__main__":
+    main()
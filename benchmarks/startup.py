@@ -0,0 +1,70 @@
+"""Cold-start benchmark: time to import the server and answer its first request.
+
+Each run is a fresh interpreter. Reports the median import time, the time
+for a first cheap request (/api/stats) and for a first PDF OCR request,
+which has to load PyMuPDF and the Vision library on demand. Vision and
+Gemini are faked, so gRPC channel setup is not included.
+
+    python benchmarks/startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def run_single():
+    import io
+    import time
+
+    os.environ.setdefault("RESULT_CACHE_ENABLED", "0")
+    os.environ.setdefault("LLM_BACKEND", "fake")
+    start = time.perf_counter()
+    import server
+    imported = time.perf_counter() - start
+
+    from fakes import FakeVisionClient, build_pdf
+    server.clients.set("vision", FakeVisionClient(latency=0))
+    client = server.app.test_client()
+
+    start = time.perf_counter()
+    client.get("/api/stats")
+    first_request = time.perf_counter() - start
+
+    pdf = build_pdf(1)
+    start = time.perf_counter()
+    client.post("/api/ocr", data={"file": (io.BytesIO(pdf), "notes.pdf")}, content_type="multipart/form-data")
+    first_ocr = time.perf_counter() - start
+
+    heavy = [name for name in ("fitz", "PIL.Image", "google.cloud.vision", "google.generativeai")
+             if name in sys.modules]
+    print(json.dumps({"import": imported, "first_request": first_request, "first_ocr": first_ocr, "loaded": heavy}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single()
+        return
+
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, __file__, "--single"], check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    for key, label in (("import", "import server"), ("first_request", "first /api/stats"), ("first_ocr", "first /api/ocr")):
+        print(f"{label:>18}: {statistics.median(r[key] for r in results) * 1000:8.1f} ms (median of {args.runs})")
+    print(f"{'loaded after OCR':>18}: {', '.join(results[-1]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
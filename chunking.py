@@ -0,0 +1,205 @@
+import contextvars
+import difflib
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_client import estimate_tokens
+from retrieval import HEADING_RE, PAGE_MARKER_RE
+
+# A window output's leading lines are taken to restate its overlap if, as a
+# whole, they are at least this similar to it
+OVERLAP_MATCH_RATIO = 0.6
+NORMALIZE_RE = re.compile(r'[\W_]+')
+
+
+class Window:
+    """A contiguous run of document lines, plus trailing lines of the previous window sent as context"""
+
+    def __init__(self, index, text, overlap="", gap="\n"):
+        self.index = index
+        self.text = text
+        self.overlap = overlap
+        self.gap = gap  # separator placed before this window's output when stitching
+
+    @property
+    def prompt_text(self):
+        return f"{self.overlap}\n{self.text}" if self.overlap else self.text
+
+
+def split_windows(text, max_tokens, overlap_tokens=0):
+    """Split text into windows of at most max_tokens estimated tokens.
+
+    Windows break before page markers and headings where possible, then at
+    blank lines, then between lines; a single line over the budget is split
+    between words. Every window after the first carries up to
+    overlap_tokens of the previous window's last lines as context.
+    """
+    lines = text.split("\n")
+    units = []
+    for block in _split_before(lines, lambda line, previous: _is_boundary(line)):
+        units.extend(_fit(block, max_tokens))
+
+    packed = []
+    current, current_tokens = [], 0
+    for unit in units:
+        tokens = estimate_tokens("\n".join(unit))
+        if current and current_tokens + tokens > max_tokens:
+            packed.append(current)
+            current, current_tokens = [], 0
+        current.extend(unit)
+        current_tokens += tokens
+    if current:
+        packed.append(current)
+
+    windows = []
+    for index, window_lines in enumerate(packed):
+        overlap, gap = "", "\n"
+        if index:
+            previous = packed[index - 1]
+            overlap = _tail(previous, overlap_tokens)
+            if not previous[-1].strip() or not window_lines[0].strip() or _is_boundary(window_lines[0]):
+                gap = "\n\n"
+        windows.append(Window(index, "\n".join(window_lines), overlap, gap))
+    return windows
+
+
+def strip_overlap(output, overlap):
+    """Drop the leading lines of a window's output that restate its overlap.
+
+    Every cut among the first few lines is scored by how similar the lines
+    before it are, taken together, to the whole overlap, and the best one
+    wins (the earliest, on a tie). Matching the whole sequence rather than
+    a single line keeps repeated lines from pulling the cut to the wrong
+    occurrence. If nothing is similar enough the model is assumed to have
+    left the overlap out and the output is kept whole.
+    """
+    overlap_lines = [line for line in (_normalize(line) for line in overlap.split("\n")) if line]
+    if not overlap_lines:
+        return output
+
+    matcher = difflib.SequenceMatcher(None, autojunk=False)
+    matcher.set_seq2("\n".join(overlap_lines))
+    output_lines = output.split("\n")
+    best, best_ratio = None, OVERLAP_MATCH_RATIO
+    head = []
+    for i, line in enumerate(output_lines):
+        normalized = _normalize(line)
+        if not normalized:
+            continue
+        head.append(normalized)
+        if len(head) > len(overlap_lines) + 2:
+            break
+        matcher.set_seq1("\n".join(head))
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best, best_ratio = i, ratio
+    if best is None:
+        return output
+    return "\n".join(output_lines[best + 1:])
+
+
+def stitch(windows, outputs):
+    """Join per-window outputs in order, keeping paragraph breaks found at window boundaries"""
+    parts = []
+    for window, output in zip(windows, outputs):
+        output = output.strip("\n")
+        if not output.strip():
+            continue
+        if parts:
+            parts.append(window.gap)
+        parts.append(output)
+    return "".join(parts)
+
+
+def map_windows(windows, convert, fallback, max_workers=4):
+    """Run convert(window.prompt_text) for every window in parallel and stitch the results.
+
+    A window whose convert raises or returns nothing is replaced by
+    fallback(window.text), so one failed call costs only its own window.
+    Returns (text, number of windows that fell back).
+    """
+    def run(window):
+        try:
+            output = convert(window.prompt_text)
+        except Exception:
+            output = None
+        if not output:
+            return fallback(window.text), True
+        return strip_overlap(output, window.overlap), False
+
+    if len(windows) == 1:
+        results = [run(windows[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(windows)))) as executor:
+            # Each window runs in a copy of the caller's context so request tracing follows
+            futures = [executor.submit(contextvars.copy_context().run, run, window) for window in windows]
+            results = [future.result() for future in futures]
+
+    return stitch(windows, [output for output, _ in results]), sum(1 for _, failed in results if failed)
+
+
+def _is_boundary(line):
+    stripped = line.strip()
+    return bool(HEADING_RE.match(stripped) or PAGE_MARKER_RE.match(stripped))
+
+
+def _split_before(lines, starts_group):
+    """Group lines, starting a new group before every line for which starts_group(line, previous) is true"""
+    groups = []
+    previous = None
+    for line in lines:
+        if not groups or starts_group(line, previous):
+            groups.append([])
+        groups[-1].append(line)
+        previous = line
+    return groups
+
+
+def _fit(lines, max_tokens):
+    """Break a block of lines into pieces within max_tokens: by paragraph, then by line, then by word"""
+    if estimate_tokens("\n".join(lines)) <= max_tokens:
+        return [lines]
+
+    pieces = []
+    paragraphs = _split_before(lines, lambda line, previous: bool(line.strip()) and not previous.strip())
+    if len(paragraphs) > 1:
+        for paragraph in paragraphs:
+            pieces.extend(_fit(paragraph, max_tokens))
+        return pieces
+    if len(lines) > 1:
+        for line in lines:
+            pieces.extend(_fit([line], max_tokens))
+        return pieces
+
+    # The estimate is additive over words, so a running total avoids re-joining
+    current, tokens = [], 0
+    for word in lines[0].split():
+        word_tokens = estimate_tokens(word)
+        if current and tokens + word_tokens > max_tokens:
+            pieces.append([" ".join(current)])
+            current, tokens = [], 0
+        current.append(word)
+        tokens += word_tokens
+    if current:
+        pieces.append([" ".join(current)])
+    return pieces
+
+
+def _tail(lines, max_tokens):
+    """The last lines of a window, up to max_tokens, without blank lines at either end"""
+    tail = []
+    tokens = 0
+    for line in reversed(lines):
+        if not tail and not line.strip():
+            continue
+        tokens += estimate_tokens(line)
+        if tokens > max_tokens:
+            break
+        tail.append(line)
+    while tail and not tail[-1].strip():
+        tail.pop()
+    return "\n".join(reversed(tail))
+
+
+def _normalize(line):
+    return NORMALIZE_RE.sub(" ", line.lower()).strip()
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+
+
+class ClientProvider:
+    """Builds API clients on first use, once per process.
+
+    Factories run lazily so importing the app opens no gRPC channels and
+    reads no credentials, and a forked worker builds its own clients rather
+    than reusing channels created in its parent.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._clients = {}  # name -> (pid, client)
+        self._errors = {}
+        self._init_seconds = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory, health_check=None):
+        """Register factory() for name; health_check(client) should raise if the client is unusable"""
+        self._factories[name] = (factory, health_check)
+
+    def set(self, name, client):
+        """Use an already built client (e.g. a fake) for name in this process"""
+        with self._lock:
+            self._clients[name] = (os.getpid(), client)
+            self._errors.pop(name, None)
+
+    def get(self, name):
+        entry = self._clients.get(name)
+        if entry is not None and entry[0] == os.getpid():
+            return entry[1]
+
+        with self._lock:
+            entry = self._clients.get(name)
+            if entry is not None and entry[0] == os.getpid():
+                return entry[1]
+            factory, _ = self._factories[name]
+            started = time.perf_counter()
+            try:
+                client = factory()
+            except Exception as e:
+                self._errors[name] = str(e)
+                raise
+            self._init_seconds[name] = round(time.perf_counter() - started, 4)
+            self._errors.pop(name, None)
+            self._clients[name] = (os.getpid(), client)
+            return client
+
+    def reset(self, name):
+        """Drop a client so the next get() builds a fresh one"""
+        with self._lock:
+            self._clients.pop(name, None)
+
+    def health(self, check=False):
+        """Report which clients are built; with check=True also build them and run their health checks"""
+        report = {}
+        for name, (_, health_check) in self._factories.items():
+            entry = self._clients.get(name)
+            status = {
+                "initialized": entry is not None and entry[0] == os.getpid(),
+                "init_seconds": self._init_seconds.get(name),
+            }
+            if check:
+                try:
+                    client = self.get(name)
+                    if health_check:
+                        health_check(client)
+                    status["healthy"] = True
+                except Exception as e:
+                    status["healthy"] = False
+                    status["error"] = str(e)
+            elif name in self._errors:
+                status["error"] = self._errors[name]
+            report[name] = status
+        return report
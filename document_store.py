@@ -0,0 +1,132 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+
+class DocumentStore:
+    """SQLite-backed store of processed study documents.
+
+    Each field (text, markdown, flashcards, ...) is stored as its own
+    zlib-compressed JSON row, so a chat turn only loads the text it needs.
+    Reads only rewrite a document's accessed_at once it is touch_interval
+    seconds old, and expired documents are swept at most every
+    sweep_interval rather than on every write.
+    """
+
+    def __init__(self, path, ttl=30 * 24 * 3600, touch_interval=3600, sweep_interval=3600):
+        self.path = path
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+    def create(self, fields):
+        """Store a new document and return its ID"""
+        document_id = uuid.uuid4().hex
+        self.update(document_id, fields)
+        return document_id
+
+    def update(self, document_id, fields):
+        """Insert or replace fields of a document"""
+        now = time.time()
+        rows = [
+            (document_id, name, zlib.compress(json.dumps(value).encode("utf-8")))
+            for name, value in fields.items()
+        ]
+        with self._lock:
+            db = self._connection()
+            db.execute(
+                "INSERT INTO documents (id, created_at, accessed_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET accessed_at = excluded.accessed_at",
+                (document_id, now, now),
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO document_fields (document_id, name, value) VALUES (?, ?, ?)",
+                rows,
+            )
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.sweep_interval
+                self._purge_expired(db, now)
+            db.commit()
+
+    def exists(self, document_id):
+        """Check whether a document is stored and not expired"""
+        with self._lock:
+            return self._touch(self._connection(), document_id)
+
+    def get_field(self, document_id, name):
+        """Return one field of a document, or None if the document or field is missing"""
+        fields = self.get(document_id, [name])
+        return fields.get(name) if fields else None
+
+    def get(self, document_id, names=None):
+        """Return a dict of the requested fields (all if names is None), or None if not found"""
+        with self._lock:
+            db = self._connection()
+            if not self._touch(db, document_id):
+                return None
+            if names is None:
+                rows = db.execute(
+                    "SELECT name, value FROM document_fields WHERE document_id = ?", (document_id,)
+                ).fetchall()
+            else:
+                placeholders = ", ".join("?" for _ in names)
+                rows = db.execute(
+                    f"SELECT name, value FROM document_fields WHERE document_id = ? AND name IN ({placeholders})",
+                    (document_id, *names),
+                ).fetchall()
+            db.commit()
+        return {name: json.loads(zlib.decompress(value)) for name, value in rows}
+
+    def _touch(self, db, document_id):
+        now = time.time()
+        row = db.execute("SELECT accessed_at FROM documents WHERE id = ?", (document_id,)).fetchone()
+        if row is None:
+            return False
+        if row[0] + self.ttl <= now:
+            self._delete(db, document_id)
+            db.commit()
+            return False
+        if now - row[0] >= self.touch_interval:
+            db.execute("UPDATE documents SET accessed_at = ? WHERE id = ?", (now, document_id))
+        return True
+
+    def _delete(self, db, document_id):
+        db.execute("DELETE FROM document_fields WHERE document_id = ?", (document_id,))
+        db.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+
+    def _purge_expired(self, db, now):
+        expired = db.execute(
+            "SELECT id FROM documents WHERE accessed_at <= ?", (now - self.ttl,)
+        ).fetchall()
+        for (document_id,) in expired:
+            self._delete(db, document_id)
+
+    def _connection(self):
+        # SQLite connections must not be shared across forked workers
+        if self._db is None or self._db_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id TEXT PRIMARY KEY, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS documents_accessed ON documents (accessed_at)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS document_fields ("
+                "document_id TEXT NOT NULL, name TEXT NOT NULL, value BLOB NOT NULL, "
+                "PRIMARY KEY (document_id, name))"
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
@@ -138,6 +138,21 @@ const validateFile = (file) => {
 	return true;
 };
 
+// Prefer referencing a server-side document over re-sending the full study
+// text; if the server no longer has the document, resend the inline context
+const withDocumentContext = async (send, context, documentId) => {
+	if (documentId) {
+		try {
+			return await send({ document_id: documentId });
+		} catch (error) {
+			if (!(error instanceof APIError && error.status === 404)) {
+				throw error;
+			}
+		}
+	}
+	return await send({ context });
+};
+
 // API Service Functions
 
 /**
@@ -183,9 +198,14 @@ export const uploadAndProcessImage = async (file, onProgress) => {
  * Process corrected text to generate study materials
  * @param {string} text - The corrected text from OCR
  * @param {string} title - Title for the study material
+ * @param {string} documentId - Server-side document to attach results to (optional)
  * @returns {Promise<Object>} Processed study materials
  */
-export const processText = async (text, title = "Study Notes") => {
+export const processText = async (
+	text,
+	title = "Study Notes",
+	documentId = null,
+) => {
 	if (!text || typeof text !== "string" || !text.trim()) {
 		throw new APIError("No text provided for processing", 400);
 	}
@@ -193,7 +213,7 @@ export const processText = async (text, title = "Study Notes") => {
 	try {
 		return await apiRequest("/process-corrected-text", {
 			method: "POST",
-			body: JSON.stringify({ text, title }),
+			body: JSON.stringify({ text, title, document_id: documentId }),
 		});
 	} catch (error) {
 		throw new APIError("Failed to process text. Please try again.", 0);
@@ -205,12 +225,14 @@ export const processText = async (text, title = "Study Notes") => {
  * @param {string} context - Study material context
  * @param {string} quizType - Type of quiz ('mcq', 'true_false', 'mixed')
  * @param {number} numQuestions - Number of questions to generate
+ * @param {string} documentId - Server-side document ID (optional)
  * @returns {Promise<Object>} Generated quiz data
  */
 export const generateQuiz = async (
 	context,
 	quizType = "mixed",
 	numQuestions = 5,
+	documentId = null,
 ) => {
 	if (!context || typeof context !== "string" || !context.trim()) {
 		throw new APIError("No study material available for quiz generation", 400);
@@ -229,14 +251,19 @@ export const generateQuiz = async (
 	}
 
 	try {
-		return await apiRequest("/generate-quiz", {
-			method: "POST",
-			body: JSON.stringify({
-				context,
-				quiz_type: quizType,
-				num_questions: numQuestions,
-			}),
-		});
+		return await withDocumentContext(
+			(source) =>
+				apiRequest("/generate-quiz", {
+					method: "POST",
+					body: JSON.stringify({
+						...source,
+						quiz_type: quizType,
+						num_questions: numQuestions,
+					}),
+				}),
+			context,
+			documentId,
+		);
 	} catch (error) {
 		throw new APIError("Failed to generate quiz. Please try again.", 0);
 	}
@@ -276,9 +303,10 @@ export const checkAnswer = async (
  * Chat with AI tutor
  * @param {string} question - User's question
  * @param {string} context - Study material context
+ * @param {string} documentId - Server-side document ID (optional)
  * @returns {Promise<Object>} Tutor response
  */
-export const chatWithTutor = async (question, context) => {
+export const chatWithTutor = async (question, context, documentId = null) => {
 	if (!question || typeof question !== "string" || !question.trim()) {
 		throw new APIError("Question is required for chat", 400);
 	}
@@ -288,15 +316,116 @@ export const chatWithTutor = async (question, context) => {
 	}
 
 	try {
-		return await apiRequest("/chat", {
-			method: "POST",
-			body: JSON.stringify({ question, context }),
-		});
+		return await withDocumentContext(
+			(source) =>
+				apiRequest("/chat", {
+					method: "POST",
+					body: JSON.stringify({ question, ...source }),
+				}),
+			context,
+			documentId,
+		);
 	} catch (error) {
 		throw new APIError("Failed to get tutor response. Please try again.", 0);
 	}
 };
 
+/**
+ * Chat with AI tutor, receiving the answer incrementally as it is generated
+ * @param {string} question - User's question
+ * @param {string} context - Study material context
+ * @param {Function} onToken - Called with each chunk of answer text
+ * @param {string} documentId - Server-side document ID (optional)
+ * @returns {Promise<Object>} Tutor response with the full answer
+ */
+export const streamChatWithTutor = async (
+	question,
+	context,
+	onToken,
+	documentId = null,
+) => {
+	if (!question || typeof question !== "string" || !question.trim()) {
+		throw new APIError("Question is required for chat", 400);
+	}
+
+	if (!context || typeof context !== "string" || !context.trim()) {
+		throw new APIError("No study material available for tutoring", 400);
+	}
+
+	const openStream = async (source) => {
+		let response;
+		try {
+			response = await fetch(`${API_BASE_URL}/chat/stream`, {
+				method: "POST",
+				headers: {
+					"Content-Type": "application/json",
+					Accept: "text/event-stream",
+				},
+				body: JSON.stringify({ question, ...source }),
+			});
+		} catch (error) {
+			throw new APIError("Network error: Unable to connect to server", 0);
+		}
+
+		if (!response.ok || !response.body) {
+			let errorMessage = `HTTP error! status: ${response.status}`;
+			try {
+				const errorData = await response.json();
+				errorMessage = errorData.error || errorMessage;
+			} catch (e) {
+				// If parsing error response fails, use generic message
+			}
+			throw new APIError(errorMessage, response.status);
+		}
+		return response;
+	};
+
+	const response = await withDocumentContext(openStream, context, documentId);
+
+	const reader = response.body.getReader();
+	const decoder = new TextDecoder();
+	let buffer = "";
+	let answer = "";
+
+	// Server-Sent Events: frames are separated by a blank line and carry
+	// an optional "event:" line plus a JSON "data:" line
+	while (true) {
+		const { value, done } = await reader.read();
+		if (done) break;
+		buffer += decoder.decode(value, { stream: true });
+
+		let boundary;
+		while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+			const frame = buffer.slice(0, boundary);
+			buffer = buffer.slice(boundary + 2);
+
+			let event = "message";
+			let data = "";
+			for (const line of frame.split("\n")) {
+				if (line.startsWith("event:")) event = line.slice(6).trim();
+				else if (line.startsWith("data:")) data += line.slice(5).trim();
+			}
+			const payload = data ? JSON.parse(data) : {};
+
+			if (event === "error") {
+				throw new APIError(
+					payload.error || "Failed to get tutor response. Please try again.",
+					0,
+				);
+			}
+			if (event === "done") {
+				return { answer: answer.trim() };
+			}
+			if (payload.delta) {
+				answer += payload.delta;
+				if (onToken) onToken(payload.delta);
+			}
+		}
+	}
+
+	return { answer: answer.trim() };
+};
+
 /**
  * Process uploaded notes JSON file
  * @param {File} file - JSON notes file
@@ -384,6 +513,7 @@ export default {
 	generateQuiz,
 	checkAnswer,
 	chatWithTutor,
+	streamChatWithTutor,
 	processNotes,
 	healthCheck,
 	getApiConfig,
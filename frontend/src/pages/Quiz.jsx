@@ -34,6 +34,7 @@ const QuizPage = () => {
 	const { isLoading } = useSelector((state) => state.ui);
 	const {
 		ocrResult,
+		documentId,
 		currentQuiz,
 		selectedAnswers,
 		currentQuestion,
@@ -60,6 +61,7 @@ const QuizPage = () => {
 			await dispatch(
 				generateQuiz({
 					context: ocrResult.corrected_text,
+					documentId,
 					quizType: quizSettings.type,
 					numQuestions: quizSettings.numQuestions,
 				}),
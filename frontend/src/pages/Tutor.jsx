@@ -5,7 +5,7 @@ import { motion, AnimatePresence } from "motion/react";
 import { MessageCircle, Send, Bot, User, Upload } from "lucide-react";
 import { useNavigate } from "react-router-dom";
 import {
-	chatWithTutor,
+	streamChatWithTutor,
 	addChatMessage,
 	clearChatHistory,
 } from "../store/slices/studySlice";
@@ -18,7 +18,9 @@ const TutorPage = () => {
 	const inputRef = useRef(null);
 
 	const isDark = useSelector((state) => state.ui.isDark);
-	const { chatHistory, ocrResult } = useSelector((state) => state.study);
+	const { chatHistory, ocrResult, documentId } = useSelector(
+		(state) => state.study,
+	);
 	const [currentMessage, setCurrentMessage] = useState("");
 	const [isTyping, setIsTyping] = useState(false);
 
@@ -28,6 +30,11 @@ const TutorPage = () => {
 
 	useEffect(scrollToBottom, [chatHistory]);
 
+	// Hide the typing indicator as soon as the streamed answer starts arriving
+	const lastMessage = chatHistory[chatHistory.length - 1];
+	const showTyping =
+		isTyping && !(lastMessage?.type === "assistant" && lastMessage.answer);
+
 	const handleSendMessage = async () => {
 		if (!currentMessage.trim()) return;
 
@@ -55,10 +62,11 @@ const TutorPage = () => {
 		);
 
 		try {
-			const result = await dispatch(
-				chatWithTutor({
+			await dispatch(
+				streamChatWithTutor({
 					question: userMessage,
 					context: ocrResult.corrected_text,
+					documentId,
 				}),
 			).unwrap();
 
@@ -255,7 +263,7 @@ const TutorPage = () => {
 							</AnimatePresence>
 						)}
 
-						{isTyping && (
+						{showTyping && (
 							<motion.div
 								className="flex justify-start"
 								initial={{ opacity: 0, y: 20 }}
@@ -20,6 +20,8 @@ export const uploadAndProcessFile = createAsyncThunk(
 			// Process the corrected text to get study materials
 			const processedResult = await apiService.processText(
 				ocrResult.corrected_text,
+				"Study Notes",
+				ocrResult.document_id,
 			);
 
 			return {
@@ -35,7 +37,7 @@ export const uploadAndProcessFile = createAsyncThunk(
 export const generateQuiz = createAsyncThunk(
 	"study/generateQuiz",
 	async (
-		{ context, quizType = "mixed", numQuestions = 5 },
+		{ context, quizType = "mixed", numQuestions = 5, documentId = null },
 		{ rejectWithValue },
 	) => {
 		try {
@@ -43,6 +45,7 @@ export const generateQuiz = createAsyncThunk(
 				context,
 				quizType,
 				numQuestions,
+				documentId,
 			);
 			return result;
 		} catch (error) {
@@ -72,9 +75,13 @@ export const checkAnswer = createAsyncThunk(
 
 export const chatWithTutor = createAsyncThunk(
 	"study/chatWithTutor",
-	async ({ question, context }, { rejectWithValue }) => {
+	async ({ question, context, documentId = null }, { rejectWithValue }) => {
 		try {
-			const result = await apiService.chatWithTutor(question, context);
+			const result = await apiService.chatWithTutor(
+				question,
+				context,
+				documentId,
+			);
 			return {
 				question,
 				answer: result.answer,
@@ -86,11 +93,70 @@ export const chatWithTutor = createAsyncThunk(
 	},
 );
 
+export const streamChatWithTutor = createAsyncThunk(
+	"study/streamChatWithTutor",
+	async (
+		{ question, context, documentId = null },
+		{ rejectWithValue, dispatch },
+	) => {
+		const messageId = `assistant-${Date.now()}`;
+		let started = false;
+
+		const startMessage = (answer = "") => {
+			started = true;
+			dispatch(addChatMessage({ id: messageId, type: "assistant", answer }));
+		};
+
+		try {
+			const result = await apiService.streamChatWithTutor(
+				question,
+				context,
+				(delta) => {
+					if (!started) startMessage();
+					dispatch(appendChatMessageDelta({ id: messageId, delta }));
+				},
+				documentId,
+			);
+			if (!started) startMessage(result.answer);
+
+			return {
+				id: messageId,
+				question,
+				answer: result.answer,
+				timestamp: new Date().toISOString(),
+			};
+		} catch (error) {
+			if (started) {
+				return rejectWithValue(error.message);
+			}
+
+			// Nothing shown yet: fall back to the non-streaming endpoint
+			try {
+				const result = await apiService.chatWithTutor(
+					question,
+					context,
+					documentId,
+				);
+				startMessage(result.answer);
+				return {
+					id: messageId,
+					question,
+					answer: result.answer,
+					timestamp: new Date().toISOString(),
+				};
+			} catch (fallbackError) {
+				return rejectWithValue(fallbackError.message);
+			}
+		}
+	},
+);
+
 const initialState = {
 	// OCR and Processing
 	ocrResult: null,
 	processedResult: null,
 	uploadProgress: 0,
+	documentId: null, // server-side copy of the processed document
 
 	// Study Materials
 	studyMaterials: [],
@@ -279,6 +345,14 @@ const studySlice = createSlice({
 			});
 		},
 
+		appendChatMessageDelta: (state, action) => {
+			const { id, delta } = action.payload;
+			const message = state.chatHistory.find((m) => m.id === id);
+			if (message) {
+				message.answer = (message.answer || "") + delta;
+			}
+		},
+
 		clearChatHistory: (state) => {
 			state.chatHistory = [];
 		},
@@ -345,6 +419,7 @@ const studySlice = createSlice({
 		resetStudyData: (state) => {
 			state.ocrResult = null;
 			state.processedResult = null;
+			state.documentId = null;
 			state.flashcards = [];
 			state.mindmap = null;
 			state.bullets = [];
@@ -371,6 +446,8 @@ const studySlice = createSlice({
 				const { ocrResult, processedResult } = action.payload;
 				state.ocrResult = ocrResult;
 				state.processedResult = processedResult;
+				state.documentId =
+					processedResult?.document_id || ocrResult?.document_id || null;
 
 				// Update study materials
 				if (processedResult) {
@@ -398,6 +475,15 @@ const studySlice = createSlice({
 		builder.addCase(chatWithTutor.fulfilled, (state, action) => {
 			state.chatHistory.push(action.payload);
 		});
+
+		// Streaming chat: the message is built up by appendChatMessageDelta,
+		// replace it with the final trimmed answer once the stream completes
+		builder.addCase(streamChatWithTutor.fulfilled, (state, action) => {
+			const message = state.chatHistory.find((m) => m.id === action.payload.id);
+			if (message) {
+				message.answer = action.payload.answer;
+			}
+		});
 	},
 });
 
@@ -427,6 +513,7 @@ export const {
 
 	// Chat
 	addChatMessage,
+	appendChatMessageDelta,
 	clearChatHistory,
 
 	// Statistics
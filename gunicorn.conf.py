@@ -0,0 +1,37 @@
+"""Gunicorn settings for serving Ylearn in production (started by serve.py).
+
+Handlers spend nearly all their time waiting on Vision and Gemini, which
+releases the GIL, so each worker process runs many threads (gthread)
+instead of relying on more processes. CPU-heavy image preprocessing
+already runs in its own process pool.
+
+Background jobs, their progress streams and the OCR batch queue live in
+the worker's memory, so with WEB_WORKERS > 1 a client's job requests must
+be routed to the same worker (sticky sessions) or job lookups will 404.
+"""
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+
+workers = int(os.getenv("WEB_WORKERS", "1"))
+worker_class = os.getenv("WEB_WORKER_CLASS", "gthread")
+# Concurrent requests per worker for gthread
+threads = int(os.getenv("WEB_THREADS", "64"))
+
+# Slow OCR/Gemini requests and SSE streams must not be killed as hung workers
+timeout = int(os.getenv("WEB_TIMEOUT", "300"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+
+# Recycle workers after this many requests (0 disables)
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "0"))
+
+# Not preloaded: the Vision/gRPC clients and SQLite connections are created
+# inside each worker rather than inherited across fork
+preload_app = False
+
+# An empty WEB_ACCESS_LOG turns access logging off
+accesslog = os.getenv("WEB_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
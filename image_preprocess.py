@@ -0,0 +1,183 @@
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from tracing import tracer
+
+
+def preprocess_image(content, max_pixels=4_000_000, grayscale=True, autocontrast=True,
+                     deskew=False, jpeg_quality=85):
+    """Prepare an image upload for OCR and return (image_bytes, report).
+
+    Applies EXIF rotation, downscales to max_pixels, optionally converts to
+    grayscale, normalizes contrast and straightens skewed text, then
+    re-encodes (JPEG for JPEG uploads, PNG otherwise). The original bytes
+    are kept when processing would not make the upload smaller and nothing
+    about the orientation changed.
+    """
+    # Imported here (in the pool worker) so the web process starts without Pillow loaded
+    from PIL import Image, ImageOps
+
+    start = time.perf_counter()
+    steps = []
+
+    image = Image.open(io.BytesIO(content))
+    original_format = image.format
+    original_size = image.size
+
+    orientation = image.getexif().get(0x0112, 1)  # EXIF orientation tag
+    image = ImageOps.exif_transpose(image)
+    if orientation != 1:
+        steps.append("exif_transpose")
+
+    width, height = image.size
+    if width * height > max_pixels:
+        scale = (max_pixels / float(width * height)) ** 0.5
+        image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+        steps.append("downscale")
+
+    if grayscale and image.mode != "L":
+        image = image.convert("L")
+        steps.append("grayscale")
+    elif image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+
+    if autocontrast:
+        image = ImageOps.autocontrast(image, cutoff=1)
+        steps.append("autocontrast")
+
+    if deskew:
+        angle = estimate_skew(image)
+        if abs(angle) >= 0.25:
+            fill = 255 if image.mode == "L" else (255, 255, 255)
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+            steps.append(f"deskew({angle:+.2f})")
+
+    # Photos stay JPEG; scans and screenshots compress better losslessly
+    output = io.BytesIO()
+    if original_format == "JPEG":
+        image.save(output, format="JPEG", quality=jpeg_quality, optimize=True)
+    else:
+        image.save(output, format="PNG", optimize=True)
+    processed = output.getvalue()
+    processed_size = image.size
+
+    geometry_changed = "exif_transpose" in steps or any(step.startswith("deskew") for step in steps)
+    if len(processed) >= len(content) and not geometry_changed:
+        processed = content
+        processed_size = original_size
+        steps.append("kept_original")
+
+    return processed, {
+        "original_bytes": len(content),
+        "processed_bytes": len(processed),
+        "original_format": original_format,
+        "original_size": list(original_size),
+        "processed_size": list(processed_size),
+        "steps": steps,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def estimate_skew(image, max_angle=5.0, step=0.5):
+    """Estimate text skew in degrees with a projection-profile search"""
+    import numpy as np
+    from PIL import Image
+
+    small = image.convert("L")
+    small.thumbnail((800, 800))
+    # Dark pixels (ink) become white so rotation padding does not add ink
+    ink = small.point(lambda value: 255 if value < 128 else 0)
+
+    best_angle = 0.0
+    best_score = -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rotated = ink.rotate(float(angle), resample=Image.NEAREST, expand=False, fillcolor=0)
+        profile = np.asarray(rotated, dtype=np.float32).sum(axis=1)
+        # Aligned text lines give sharp peaks and gaps in the row sums
+        score = float(np.var(profile))
+        if score > best_score:
+            best_score = score
+            best_angle = float(angle)
+    return best_angle
+
+
+class ImagePreprocessor:
+    """Runs preprocess_image in a process pool so request threads don't hold the GIL.
+
+    Workers are started with forkserver (spawn where unavailable) rather than
+    forked from a web process full of threads and open connections. An image
+    not done within timeout seconds is processed inline instead.
+    """
+
+    def __init__(self, max_workers=2, enabled=True, timeout=30, **options):
+        self.max_workers = max(1, max_workers)
+        self.enabled = enabled
+        self.timeout = timeout
+        self.options = options
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._stats = {"images": 0, "original_bytes": 0, "processed_bytes": 0, "seconds": 0.0, "failures": 0,
+                       "timeouts": 0}
+
+    def run(self, content):
+        """Return (image_bytes, report); falls back to the original bytes if processing fails"""
+        if not self.enabled:
+            return content, None
+
+        try:
+            try:
+                with tracer.span("image.preprocess", bytes=len(content)):
+                    future = self._pool_for_process().submit(preprocess_image, content, **self.options)
+                    processed, report = future.result(timeout=self.timeout)
+            except TimeoutError:
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                    if not future.cancel():
+                        # A worker is stuck on this image: leave it behind with its pool
+                        self._discard_pool()
+                processed, report = preprocess_image(content, **self.options)
+            except BrokenProcessPool:
+                # A crashed worker poisons the pool; rebuild it next time and process inline now
+                with self._lock:
+                    self._discard_pool()
+                processed, report = preprocess_image(content, **self.options)
+        except Exception as e:
+            # Unreadable or unsupported images go to OCR untouched
+            with self._lock:
+                self._stats["failures"] += 1
+            return content, {"error": str(e)}
+
+        with self._lock:
+            self._stats["images"] += 1
+            self._stats["original_bytes"] += report["original_bytes"]
+            self._stats["processed_bytes"] += report["processed_bytes"]
+            self._stats["seconds"] += report["seconds"]
+        return processed, report
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _pool_for_process(self):
+        # Created lazily and per process: pools must not be inherited across fork
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_mp_context())
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _discard_pool(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
@@ -0,0 +1,199 @@
+import queue
+import threading
+import time
+import uuid
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's function when the job has been cancelled"""
+
+
+class QueueFull(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class Job:
+    """A unit of background work with observable progress"""
+
+    def __init__(self, kind, func, args, kwargs, on_finish=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_finish = on_finish
+        self.status = "queued"
+        self.progress = {"stages_completed": []}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.version = 0
+        self._cancel_requested = threading.Event()
+        self._cond = threading.Condition()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_requested.is_set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested; call between units of work"""
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    def report(self, **progress):
+        """Merge progress fields (e.g. pages_done, pages_total) and notify subscribers"""
+        with self._cond:
+            self.progress.update(progress)
+            self._bump()
+        self.check_cancelled()
+
+    def stage_completed(self, name, status="ok"):
+        """Record a finished pipeline stage"""
+        with self._cond:
+            self.progress["stages_completed"].append({"stage": name, "status": status})
+            self._bump()
+        self.check_cancelled()
+
+    def wait_for_update(self, version, timeout=None):
+        """Block until the job changes past version (or timeout); return the new version"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    def to_dict(self, include_result=True):
+        with self._cond:
+            data = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "progress": {
+                    **self.progress,
+                    "stages_completed": list(self.progress["stages_completed"]),
+                },
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+            if self.error:
+                data["error"] = self.error
+            if include_result and self.status == "succeeded":
+                data["result"] = self.result
+            return data
+
+    @property
+    def finished(self):
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def _set_status(self, status, result=None, error=None, only_from=None):
+        """Move to status (only from one of the only_from statuses, if given); returns whether it did"""
+        with self._cond:
+            if only_from is not None and self.status not in only_from:
+                return False
+            self.status = status
+            self.result = result
+            self.error = error
+            on_finish = None
+            if self.finished:
+                self.finished_at = time.time()
+                # Drop references to the (possibly large) inputs
+                self.args, self.kwargs = (), {}
+                on_finish, self.on_finish = self.on_finish, None
+            self._bump()
+        if on_finish:
+            on_finish(self)
+        return True
+
+    def _bump(self):
+        self.version += 1
+        self._cond.notify_all()
+
+
+class JobManager:
+    """Runs jobs on a bounded pool of worker threads fed by a local queue"""
+
+    def __init__(self, max_workers=2, max_queued=32, result_ttl=3600):
+        self.max_workers = max(1, max_workers)
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def submit(self, kind, func, *args, on_finish=None, **kwargs):
+        """Queue func(job, *args, **kwargs) and return the Job immediately.
+
+        on_finish(job) runs once when the job succeeds, fails or is cancelled.
+        """
+        job = Job(kind, func, args, kwargs, on_finish=on_finish)
+        with self._lock:
+            self._purge_expired()
+            self._ensure_workers()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull("Too many jobs queued, try again later")
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._purge_expired()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation; queued jobs never start, running jobs stop at their next checkpoint"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not job.finished:
+            job._cancel_requested.set()
+            # Only a job no worker has picked up is finished here; a running one
+            # finishes (and cleans up) on its worker once it stops
+            job._set_status("cancelled", only_from=("queued",))
+        return job
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"workers": self.max_workers, "queued": self._queue.qsize(), "jobs": counts}
+
+    def _ensure_workers(self):
+        # Started lazily so pre-fork servers get their own workers per process
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._run, name="job-worker", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job.cancel_requested:
+                    job._set_status("cancelled", only_from=("queued",))
+                    continue
+                if not job._set_status("running", only_from=("queued",)):
+                    continue  # cancelled since it was taken off the queue
+                try:
+                    result = job.func(job, *job.args, **job.kwargs)
+                except Exception as e:
+                    # Cancellation may surface as whatever the pipeline wrapped it in
+                    if job.cancel_requested:
+                        job._set_status("cancelled")
+                    else:
+                        job._set_status("failed", error=str(e))
+                else:
+                    job._set_status("cancelled" if job.cancel_requested else "succeeded", result=result)
+            finally:
+                self._queue.task_done()
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at + self.result_ttl <= now
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
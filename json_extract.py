@@ -0,0 +1,217 @@
+import json
+import re
+import threading
+
+FENCE_RE = re.compile(r'```[a-zA-Z]*[ \t]*\n?|```')
+
+_decoder = json.JSONDecoder()
+
+
+def strip_code_fences(text):
+    """Remove markdown code fences (```json ... ```) around or inside a response"""
+    return FENCE_RE.sub("", text)
+
+
+def find_json(text, expect=None):
+    """Return the JSON object or array in text that is most likely the payload.
+
+    Fences are ignored. Every top-level value in the text is a candidate;
+    an array that is cut off or has broken items counts with the items
+    that still decode, and values nested inside a candidate (even a broken
+    one) are not candidates themselves. Candidates of the expected type
+    (or, when a list is expected, objects wrapping a single list) beat the
+    rest, then the longest wins, then the earliest, so a bracketed aside in
+    the prose (e.g. "[1]") never shadows the answer.
+    Raises ValueError if there is none.
+    """
+    return _best_candidate(strip_code_fences(text), expect)[0]
+
+
+def _best_candidate(text, expect):
+    """(value, broken items) of the best candidate in fence-free text; broken is 0 for a clean decode"""
+    best, best_rank = None, None
+    start = 0
+    while True:
+        candidates = [i for i in (text.find("{", start), text.find("[", start)) if i >= 0]
+        if not candidates:
+            break
+        start = min(candidates)
+        try:
+            value, end = _decoder.raw_decode(text, start)
+            broken = 0
+        except json.JSONDecodeError:
+            if text[start] != "[":
+                start += 1
+                continue
+            stream = JSONArrayStream()
+            value = stream.feed(text[start:])
+            if not value:
+                start += 1
+                continue
+            end = start + stream.end if stream.done else len(text)
+            broken = stream.broken_items + (0 if stream.done else 1)
+        rank = (expect is None or _matches(value, expect), end - start, -start)
+        if best_rank is None or rank > best_rank:
+            best, best_rank = (value, broken), rank
+        start = end
+    if best_rank is None:
+        raise ValueError("No JSON value found in response")
+    return best
+
+
+def _matches(value, expect):
+    if isinstance(value, expect):
+        return True
+    return expect is list and isinstance(value, dict) and len(_nested_lists(value)) == 1
+
+
+def _nested_lists(value):
+    return [item for item in value.values() if isinstance(item, list)]
+
+
+class JSONArrayStream:
+    """Yields the items of a top-level JSON array as its text arrives.
+
+    Text before the opening bracket (prose, a code fence) is skipped. Each
+    item is decoded on its own once the scanner sees the comma or bracket
+    that ends it, so items before a truncated or malformed one survive.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.item_start = None
+        self.done = False
+        self.end = None  # index just past the closing bracket, once done
+        self.broken_items = 0
+
+    def feed(self, chunk):
+        """Add text and return the items completed by it"""
+        self.buffer += chunk
+        items = []
+        buffer = self.buffer
+        for i in range(self.pos, len(buffer)):
+            if self.done:
+                break
+            char = buffer[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+            if self.depth == 0:
+                if char == "[":
+                    self.depth = 1
+                continue
+            if self.depth == 1 and char in ",]":
+                self._finish_item(buffer[self.item_start:i] if self.item_start is not None else "", items)
+                self.item_start = None
+                if char == "]":
+                    self.done = True
+                    self.end = i + 1
+                    self.depth = 0
+                continue
+            if self.item_start is None and not char.isspace():
+                self.item_start = i
+            if char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.depth += 1
+            elif char in "]}":
+                self.depth -= 1
+        self.pos = len(buffer)
+        return items
+
+    def _finish_item(self, text, items):
+        text = text.strip()
+        if not text:
+            return
+        try:
+            items.append(json.loads(text))
+        except json.JSONDecodeError:
+            self.broken_items += 1
+
+
+class JSONExtractor:
+    """Tolerant parsing of LLM JSON responses with per-artifact outcome counts.
+
+    extract() tries a plain json.loads, then the best JSON value found in
+    the text (see find_json), which for a broken array is the items that
+    still decode.
+    Array items failing item_valid are dropped and repair(value) may drop
+    malformed parts of an object; a value then failing valid, or an array
+    left empty, raises ValueError so the caller falls back.
+    record_fallback() counts those fallbacks per artifact.
+    """
+
+    OUTCOMES = ("clean", "repaired", "salvaged", "invalid", "fallbacks")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def extract(self, kind, text, expect=list, item_valid=None, repair=None, valid=None):
+        value, outcome, dropped = self._parse(text or "", expect)
+        if expect is list and item_valid is not None:
+            kept = [item for item in value if item_valid(item)]
+            dropped += len(value) - len(kept)
+            value = kept
+        if repair is not None:
+            repaired = repair(value)
+            if repaired != value:
+                dropped += 1
+            value = repaired
+        if dropped and outcome != "salvaged":
+            outcome = "salvaged"
+        if (expect is list and not value) or (valid is not None and not valid(value)):
+            self._count(kind, "invalid")
+            raise ValueError(f"LLM response has no valid {kind}")
+        self._count(kind, outcome)
+        self._count(kind, "dropped_items", dropped)
+        return value
+
+    def record_fallback(self, kind):
+        self._count(kind, "fallbacks")
+
+    def stats(self):
+        with self._lock:
+            report = {kind: dict(stats) for kind, stats in self._stats.items()}
+        for stats in report.values():
+            parsed = stats["clean"] + stats["repaired"] + stats["salvaged"]
+            total = parsed + stats["fallbacks"]
+            stats["fallback_rate"] = round(stats["fallbacks"] / total, 3) if total else 0.0
+        return report
+
+    def _parse(self, text, expect):
+        try:
+            value = json.loads(text)
+            if isinstance(value, expect):
+                return value, "clean", 0
+        except json.JSONDecodeError:
+            pass
+        try:
+            value, broken = _best_candidate(strip_code_fences(text), expect)
+        except ValueError:
+            value, broken = None, 0
+        # e.g. {"questions": [...]} where a bare array was asked for. Only
+        # top-level candidates are unwrapped: an item of a broken array that
+        # holds a list (an MCQ's options) is never one.
+        if expect is list and isinstance(value, dict) and _matches(value, list):
+            value = _nested_lists(value)[0]
+        if not isinstance(value, expect):
+            raise ValueError("Could not parse JSON from LLM response")
+        return value, "salvaged" if broken else "repaired", broken
+
+    def _count(self, kind, name, amount=1):
+        with self._lock:
+            stats = self._stats.get(kind)
+            if stats is None:
+                stats = self._stats[kind] = dict.fromkeys(self.OUTCOMES, 0)
+                stats["dropped_items"] = 0
+            stats[name] += amount
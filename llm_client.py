@@ -0,0 +1,361 @@
+import os
+import random
+import re
+import threading
+import time
+
+from tracing import tracer
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # pragma: no cover - only the fake backend is usable then
+    google_exceptions = None
+
+
+class LLMError(Exception):
+    """Base class for errors raised by LLMClient itself"""
+
+
+class CircuitOpen(LLMError):
+    """Raised without calling the backend while the circuit breaker is open"""
+
+
+class DeadlineExceeded(LLMError):
+    """Raised when a call (including rate-limit waits and retries) runs out of time"""
+
+
+class RetriableError(Exception):
+    """Transient backend failure worth retrying (raised by FakeBackend)"""
+
+
+if google_exceptions is not None:
+    RETRIABLE_ERRORS = (
+        RetriableError,
+        ConnectionError,
+        TimeoutError,
+        google_exceptions.ResourceExhausted,  # 429 quota / rate limit
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+else:
+    RETRIABLE_ERRORS = (RetriableError, ConnectionError, TimeoutError)
+
+
+# Rough SentencePiece-style pieces: digits one at a time, letters in runs of
+# up to 8, and every other non-space character on its own
+TOKEN_PIECE_RE = re.compile(r'\d|[^\W\d_]{1,8}|[^\w\s]|_')
+
+
+def estimate_tokens(text):
+    """Local estimate of the model tokens in text, without calling the API.
+
+    Used for rate limiting, chunking and prompt budgets alike. No piece
+    spans whitespace, so the estimate for a text is the sum of the
+    estimates for its words.
+    """
+    return len(TOKEN_PIECE_RE.findall(text))
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute.
+
+    Callers reserve capacity up front and wait out the returned delay, so
+    concurrent callers are served in order instead of racing for refills.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Take amount from the bucket and return how many seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # A single request larger than the bucket would otherwise never fit
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+    def refund(self, amount):
+        """Return a reservation that was not used"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + min(amount, self.capacity))
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures and lets one probe through after reset_timeout"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def release(self):
+        """Give up a probe slot without an outcome"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class GeminiBackend:
+    """google.generativeai backend; GenerativeModel instances are created once per model name.
+
+    client_factory returns the configured genai module; it is called on the
+    first request, so importing and configuring genai is deferred until then.
+    Token counts reported for the calling thread's latest response are
+    available from last_usage().
+    """
+
+    def __init__(self, client_factory=None):
+        self.client_factory = client_factory
+        self._models = {}
+        self._models_pid = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _model(self, name):
+        with self._lock:
+            # Models hold gRPC channels, which must not be reused across fork
+            if self._models_pid != os.getpid():
+                self._models = {}
+                self._models_pid = os.getpid()
+            model = self._models.get(name)
+            if model is None:
+                if self.client_factory is not None:
+                    genai = self.client_factory()
+                else:
+                    import google.generativeai as genai
+                model = self._models[name] = genai.GenerativeModel(name)
+            return model
+
+    def generate(self, model, prompt, generation_config=None, timeout=None):
+        self._local.usage = None
+        response = self._model(model).generate_content(
+            prompt, generation_config=generation_config, request_options=_request_options(timeout)
+        )
+        self._local.usage = _usage(response)
+        return response.text if response else ""
+
+    def stream(self, model, prompt, generation_config=None, timeout=None):
+        self._local.usage = None
+        response = self._model(model).generate_content(
+            prompt, generation_config=generation_config, request_options=_request_options(timeout), stream=True
+        )
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+        self._local.usage = _usage(response)
+
+    def last_usage(self):
+        return getattr(self._local, "usage", None)
+
+
+def _usage(response):
+    """{"prompt_tokens", "output_tokens"} from a response's usage metadata, if it has any"""
+    metadata = getattr(response, "usage_metadata", None)
+    if not metadata or not getattr(metadata, "prompt_token_count", None):
+        return None
+    return {
+        "prompt_tokens": metadata.prompt_token_count,
+        "output_tokens": getattr(metadata, "candidates_token_count", 0) or 0,
+    }
+
+
+def _request_options(timeout):
+    return {"timeout": timeout} if timeout else None
+
+
+class FakeBackend:
+    """Offline backend: answers with handler(prompt) after latency seconds.
+
+    The first `failures` calls raise RetriableError, which is enough to
+    exercise retries, deadlines and the circuit breaker without network.
+    """
+
+    def __init__(self, handler=None, latency=0.0, failures=0):
+        self.handler = handler or (lambda prompt, **kwargs: "")
+        self.latency = latency
+        self.failures = failures
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, model, prompt, generation_config=None, timeout=None):
+        with self._lock:
+            self.calls += 1
+            fail = self.calls <= self.failures
+        if self.latency:
+            time.sleep(self.latency if timeout is None else min(self.latency, timeout))
+        if fail:
+            raise RetriableError("fake transient failure")
+        return self.handler(prompt, model=model, generation_config=generation_config)
+
+    def stream(self, model, prompt, generation_config=None, timeout=None):
+        text = self.generate(model, prompt, generation_config=generation_config, timeout=timeout)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            yield word if i == len(words) - 1 else word + " "
+
+
+class LLMClient:
+    """Shared entry point for LLM calls with rate limiting, retries, deadlines and a circuit breaker.
+
+    Rate limits are requests and (estimated prompt) tokens per minute; 0
+    disables a limit. Retriable errors are retried with jittered
+    exponential backoff until max_retries or the call's deadline.
+    """
+
+    def __init__(self, backend, model, requests_per_minute=0, tokens_per_minute=0,
+                 max_retries=3, base_delay=1.0, max_delay=30.0, deadline=120.0,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.backend = backend
+        self.model = model
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self._lock = threading.Lock()
+        self._metrics = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "deadline_exceeded": 0,
+            "circuit_rejections": 0,
+            "rate_limit_wait_seconds": 0.0,
+            "latency_seconds": 0.0,
+            "prompt_tokens": 0,
+        }
+
+    def generate(self, prompt, generation_config=None, deadline=None):
+        """Return the response text for prompt"""
+        with tracer.span("llm.generate", prompt_tokens=estimate_tokens(prompt)) as span:
+            text = self._call(
+                lambda timeout: self.backend.generate(self.model, prompt, generation_config, timeout),
+                prompt, deadline,
+            )
+            span.set(response_tokens=estimate_tokens(text) if text else 0)
+        return text
+
+    def stream(self, prompt, generation_config=None, deadline=None):
+        """Yield response text chunks; only failures before the first chunk are retried"""
+        def first_chunk(timeout):
+            chunks = iter(self.backend.stream(self.model, prompt, generation_config, timeout))
+            return next(chunks, None), chunks
+
+        with tracer.span("llm.stream_first_chunk", prompt_tokens=estimate_tokens(prompt)):
+            first, rest = self._call(first_chunk, prompt, deadline)
+        if first is None:
+            return
+        yield first
+        yield from rest
+
+    def last_usage(self):
+        """Token counts the backend reported for this thread's latest call, or None if unknown"""
+        last_usage = getattr(self.backend, "last_usage", None)
+        return last_usage() if last_usage else None
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["circuit_state"] = self.breaker.state
+        metrics["avg_latency_seconds"] = (
+            metrics["latency_seconds"] / metrics["successes"] if metrics["successes"] else 0.0
+        )
+        return metrics
+
+    def _call(self, attempt, prompt, deadline):
+        expires_at = time.monotonic() + (deadline or self.deadline)
+        tokens = max(1, estimate_tokens(prompt))
+        self._count("calls")
+        self._count("prompt_tokens", tokens)
+
+        if not self.breaker.allow():
+            self._count("circuit_rejections")
+            raise CircuitOpen("LLM backend is failing, not calling it for now")
+
+        retries = 0
+        while True:
+            self._wait_for_capacity(tokens, expires_at)
+            started = time.monotonic()
+            try:
+                result = attempt(expires_at - started)
+            except RETRIABLE_ERRORS as e:
+                delay = min(self.max_delay, self.base_delay * 2 ** retries) * random.uniform(0.5, 1.0)
+                if retries >= self.max_retries or time.monotonic() + delay >= expires_at:
+                    self._fail()
+                    raise
+                retries += 1
+                self._count("retries")
+                time.sleep(delay)
+                continue
+            except Exception:
+                # Bad requests and blocked responses mean the backend itself is up
+                self.breaker.record_success()
+                self._count("failures")
+                raise
+            self.breaker.record_success()
+            self._count("successes")
+            self._count("latency_seconds", time.monotonic() - started)
+            return result
+
+    def _wait_for_capacity(self, tokens, expires_at):
+        reservations = [(bucket, amount) for bucket, amount in
+                        ((self.request_bucket, 1), (self.token_bucket, tokens)) if bucket]
+        wait = max([bucket.reserve(amount) for bucket, amount in reservations], default=0.0)
+        if not wait:
+            return
+        if time.monotonic() + wait >= expires_at:
+            for bucket, amount in reservations:
+                bucket.refund(amount)
+            # Local saturation says nothing about backend health
+            self.breaker.release()
+            self._count("deadline_exceeded")
+            self._count("failures")
+            raise DeadlineExceeded(f"Rate limit wait of {wait:.1f}s exceeds the call deadline")
+        self._count("rate_limit_wait_seconds", wait)
+        time.sleep(wait)
+
+    def _fail(self):
+        self.breaker.record_failure()
+        self._count("failures")
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._metrics[name] += amount
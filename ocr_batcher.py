@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from tracing import tracer
+
+
+class OCRBatcher:
+    """Groups OCR requests into batch_annotate_images calls.
+
+    Images submitted from any thread (and therefore from any HTTP request)
+    within a short window are coalesced into one Vision RPC, and each caller
+    gets back its own AnnotateImageResponse through a Future.
+
+    Pass either a Vision client or client_factory, a callable returning one
+    that is only invoked when the first batch is sent.
+    """
+
+    def __init__(self, client=None, max_batch_size=8, max_wait=0.05,
+                 max_batch_bytes=20 * 1024 * 1024, max_concurrent_batches=4, client_factory=None):
+        self.client = client
+        self.client_factory = client_factory
+        # Vision accepts at most 16 images per synchronous batch request
+        self.max_batch_size = max(1, min(max_batch_size, 16))
+        self.max_wait = max_wait
+        self.max_batch_bytes = max_batch_bytes
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._dispatcher = None
+        self._executor = None
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._images = 0
+        self._failed_batches = 0
+        self._max_batch_size_seen = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+        self._batch_size_counts = {}
+
+    def submit(self, content):
+        """Queue image bytes for OCR and return a Future of the Vision response"""
+        future = Future()
+        with self._cond:
+            self._ensure_started()
+            self._queue.append((content, future, time.monotonic()))
+            self._cond.notify()
+        return future
+
+    def annotate(self, content, timeout=None):
+        """OCR image bytes, blocking until the batch containing them completes"""
+        return self.submit(content).result(timeout=timeout)
+
+    def stats(self):
+        """Return batch-size and wait-time metrics"""
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "images": self._images,
+                "failed_batches": self._failed_batches,
+                "avg_batch_size": self._images / self._batches if self._batches else 0.0,
+                "max_batch_size": self._max_batch_size_seen,
+                "batch_size_counts": dict(self._batch_size_counts),
+                "avg_wait_ms": self._total_wait / self._images * 1000 if self._images else 0.0,
+                "max_wait_ms": self._max_wait_seen * 1000,
+                "queued": len(self._queue),
+            }
+
+    def _ensure_started(self):
+        # Started lazily so pre-fork servers get one dispatcher per worker process
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches)
+            self._dispatcher = threading.Thread(target=self._run, name="ocr-batcher", daemon=True)
+            self._dispatcher.start()
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            self._executor.submit(self._send_batch, batch)
+
+    def _collect_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+
+            # The window opens when the oldest queued image arrived
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            batch_bytes = 0
+            while self._queue and len(batch) < self.max_batch_size:
+                size = len(self._queue[0][0])
+                if batch and batch_bytes + size > self.max_batch_bytes:
+                    break
+                batch.append(self._queue.popleft())
+                batch_bytes += size
+            return batch
+
+    def _send_batch(self, batch):
+        sent_at = time.monotonic()
+        self._record_batch(batch, sent_at)
+
+        try:
+            # Imported here so the Vision library loads with the first OCR request, not at startup
+            from google.cloud import vision
+
+            feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+            requests = [
+                vision.AnnotateImageRequest(image=vision.Image(content=content), features=[feature])
+                for content, _, _ in batch
+            ]
+            client = self.client if self.client is not None else self.client_factory()
+            with tracer.span("vision.batch_annotate", images=len(batch),
+                             bytes=sum(len(content) for content, _, _ in batch)):
+                response = client.batch_annotate_images(requests=requests)
+            responses = list(response.responses)
+            if len(responses) != len(batch):
+                raise Exception(f"Expected {len(batch)} OCR responses, got {len(responses)}")
+        except Exception as e:
+            with self._stats_lock:
+                self._failed_batches += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), image_response in zip(batch, responses):
+            future.set_result(image_response)
+
+    def _record_batch(self, batch, sent_at):
+        with self._stats_lock:
+            size = len(batch)
+            self._batches += 1
+            self._images += size
+            self._max_batch_size_seen = max(self._max_batch_size_seen, size)
+            self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+            for _, _, enqueued_at in batch:
+                waited = sent_at - enqueued_at
+                self._total_wait += waited
+                self._max_wait_seen = max(self._max_wait_seen, waited)
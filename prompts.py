@@ -0,0 +1,150 @@
+import re
+import threading
+
+from llm_client import estimate_tokens
+from retrieval import PAGE_MARKER_RE, select_coverage_context, select_relevant_context
+from tracing import tracer
+
+INNER_SPACE_RE = re.compile(r'(?<=\S)[ \t]{2,}')
+BLANK_LINES_RE = re.compile(r'\n{3,}')
+ALNUM_RE = re.compile(r'[^\W_]')
+
+STRATEGIES = ("truncate", "coverage", "relevant")
+
+
+def compact_text(text, drop_noise=False):
+    """Normalize whitespace in prompt material.
+
+    Trailing spaces, runs of inner spaces and repeated blank lines are
+    collapsed. With drop_noise, page markers and lines without a single
+    letter or digit (OCR specks, stray bullets, rules) are dropped too;
+    lines that might be table rows, code fences or equations are kept.
+    """
+    lines = []
+    for line in text.split("\n"):
+        line = INNER_SPACE_RE.sub(" ", line.rstrip())
+        if drop_noise:
+            stripped = line.strip()
+            if PAGE_MARKER_RE.match(stripped):
+                continue
+            if stripped and not ALNUM_RE.search(stripped) and not any(c in stripped for c in "|`="):
+                continue
+        lines.append(line)
+    return BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip("\n")
+
+
+def fit_budget(text, max_tokens, strategy="truncate", query=None):
+    """Shrink text to about max_tokens estimated tokens.
+
+    "coverage" keeps a section-balanced sample of the document (an
+    extractive summary), "relevant" keeps the chunks that best match query,
+    and "truncate" keeps whole lines from the start. Returns the text and
+    whether anything was cut.
+    """
+    tokens = estimate_tokens(text)
+    if not max_tokens or tokens <= max_tokens:
+        return text, False
+
+    max_words = max(1, len(text.split()) * max_tokens // tokens)
+    if strategy == "coverage":
+        text = select_coverage_context(text, max_words, seed=0)
+    elif strategy == "relevant":
+        text = select_relevant_context(text, query or "", max_words)
+    if estimate_tokens(text) <= max_tokens:
+        return text, True
+
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        used += estimate_tokens(line) + 1
+        if used > max_tokens:
+            break
+        kept.append(line)
+    return "\n".join(kept), True
+
+
+class PromptBudget:
+    """How material for one kind of prompt is prepared"""
+
+    def __init__(self, max_tokens=0, strategy="truncate", drop_noise=True):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown budget strategy: {strategy}")
+        self.max_tokens = max_tokens
+        self.strategy = strategy
+        self.drop_noise = drop_noise
+
+
+class PromptInput:
+    """Material prepared for a prompt, with its token estimates before and after preparation"""
+
+    def __init__(self, kind, text, raw_tokens, tokens, truncated):
+        self.kind = kind
+        self.text = text
+        self.raw_tokens = raw_tokens
+        self.tokens = tokens
+        self.truncated = truncated
+
+
+class PromptBuilder:
+    """Compacts and budgets the material interpolated into each kind of prompt.
+
+    record() compares the local estimate for the finished prompt with the
+    token counts the API reports, per prompt kind, so savings from
+    compaction and the estimator's accuracy can be tracked in stats().
+    """
+
+    def __init__(self, budgets=None, default=None):
+        self.budgets = budgets or {}
+        self.default = default or PromptBudget()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def prepare(self, kind, text, query=None):
+        budget = self.budgets.get(kind, self.default)
+        with tracer.span(f"prompt.{kind}") as span:
+            raw_tokens = estimate_tokens(text)
+            compacted = compact_text(text, drop_noise=budget.drop_noise)
+            compacted, truncated = fit_budget(compacted, budget.max_tokens, budget.strategy, query)
+            tokens = estimate_tokens(compacted)
+            span.set(raw_tokens=raw_tokens, tokens=tokens)
+        return PromptInput(kind, compacted, raw_tokens, tokens, truncated)
+
+    def record(self, material, prompt, usage=None):
+        """Record one sent prompt; usage is the API's {"prompt_tokens", "output_tokens"} if known"""
+        estimated = estimate_tokens(prompt)
+        with self._lock:
+            stats = self._stats.get(material.kind)
+            if stats is None:
+                stats = self._stats[material.kind] = {
+                    "calls": 0,
+                    "truncated": 0,
+                    "raw_input_tokens": 0,
+                    "input_tokens": 0,
+                    "estimated_prompt_tokens": 0,
+                    "measured_calls": 0,
+                    "measured_estimated_tokens": 0,
+                    "actual_prompt_tokens": 0,
+                    "actual_output_tokens": 0,
+                }
+            stats["calls"] += 1
+            stats["truncated"] += int(material.truncated)
+            stats["raw_input_tokens"] += material.raw_tokens
+            stats["input_tokens"] += material.tokens
+            stats["estimated_prompt_tokens"] += estimated
+            if usage and usage.get("prompt_tokens"):
+                stats["measured_calls"] += 1
+                stats["measured_estimated_tokens"] += estimated
+                stats["actual_prompt_tokens"] += usage["prompt_tokens"]
+                stats["actual_output_tokens"] += usage.get("output_tokens") or 0
+
+    def stats(self):
+        with self._lock:
+            report = {kind: dict(stats) for kind, stats in self._stats.items()}
+        for stats in report.values():
+            stats["saved_input_tokens"] = stats["raw_input_tokens"] - stats["input_tokens"]
+            # Above 1.0 the local estimate undercounts what the API bills
+            stats["actual_to_estimated"] = (
+                round(stats["actual_prompt_tokens"] / stats["measured_estimated_tokens"], 3)
+                if stats["measured_estimated_tokens"] else None
+            )
+        return report
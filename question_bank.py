@@ -0,0 +1,221 @@
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+
+QUESTION_TYPES = ("mcq", "true_false")
+DIFFICULTIES = ("easy", "medium", "hard")
+# Share of MCQs in a mixed quiz, as asked for in the mixed format instructions
+MIXED_MCQ_SHARE = 0.6
+NORMALIZE_RE = re.compile(r'[\W_]+')
+
+
+def normalize_question(text):
+    """Question text reduced to lowercase words, used to spot duplicates"""
+    return NORMALIZE_RE.sub(" ", str(text).lower()).strip()
+
+
+def question_type(question):
+    if question.get("type") in QUESTION_TYPES:
+        return question["type"]
+    return "mcq" if question.get("options") else "true_false"
+
+
+def question_difficulty(question):
+    difficulty = str(question.get("difficulty", "")).lower()
+    return difficulty if difficulty in DIFFICULTIES else "medium"
+
+
+class QuestionBank:
+    """Per-document pool of validated quiz questions, so retakes skip Gemini.
+
+    The bank is stored as a field of the document, tagged with a source key
+    (a hash of the study text and prompt version); a bank built from other
+    text is ignored. Questions are deduplicated by normalized text and
+    served by type and difficulty. generate(context, quiz_type, count)
+    returns validated questions; it fills the bank in the background after
+    a document is processed and whenever a type runs low, and is called
+    inline only when the bank cannot cover a request.
+    """
+
+    def __init__(self, document_store, generate, target_size=20, batch_size=10, max_workers=1,
+                 field="question_bank"):
+        self.document_store = document_store
+        self.generate = generate
+        self.target_size = target_size
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.field = field
+        self._lock = threading.Lock()
+        # Serialize read-merge-write of a document's bank without holding
+        # self._lock across the document store; striped to stay bounded
+        self._write_locks = [threading.Lock() for _ in range(16)]
+        self._filling = set()
+        self._executor = None
+        self._metrics = {
+            "served_from_bank": 0,
+            "generated_inline": 0,
+            "fills": 0,
+            "fill_failures": 0,
+            "questions_added": 0,
+            "duplicates_dropped": 0,
+        }
+
+    def get_quiz(self, document_id, context, source_key, quiz_type, count, rng=None):
+        """Questions for a quiz, sampled from the bank and generated inline only if it is short"""
+        bank = self._load(document_id, source_key)
+        questions = self._sample(bank, quiz_type, count, rng)
+        if len(questions) >= count:
+            self._count("served_from_bank")
+        else:
+            generated = self.generate(context, quiz_type, max(count, self.batch_size))
+            self._count("generated_inline")
+            bank = self.add(document_id, source_key, generated)
+            questions = self._sample(bank, quiz_type, count, rng)
+            if len(questions) < count:
+                # The fresh questions were validated for this quiz type even if the
+                # bank files some of them under another one (e.g. true/false with options)
+                chosen = {normalize_question(question["question"]) for question in questions}
+                for question in generated:
+                    key = normalize_question(question.get("question", ""))
+                    if len(questions) >= count:
+                        break
+                    if key and key not in chosen:
+                        chosen.add(key)
+                        questions.append(question)
+            if not questions:
+                raise ValueError("No quiz questions available")
+
+        if self._runs_low(bank, quiz_type):
+            self.fill_async(document_id, context, source_key)
+        return questions
+
+    def add(self, document_id, source_key, questions, exhausted_type=None):
+        """Add questions not already banked; returns the updated bank"""
+        with self._write_lock(document_id):
+            bank = self._load(document_id, source_key)
+            seen = {normalize_question(question["question"]) for question in bank["questions"]}
+            added = 0
+            for question in questions:
+                key = normalize_question(question.get("question", ""))
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                bank["questions"].append(dict(question, type=question_type(question),
+                                              difficulty=question_difficulty(question)))
+                added += 1
+            if exhausted_type and not added and exhausted_type not in bank["exhausted"]:
+                # Gemini keeps repeating itself: stop topping up this type for this text
+                bank["exhausted"].append(exhausted_type)
+            self.document_store.update(document_id, {self.field: bank})
+        self._count("questions_added", added)
+        self._count("duplicates_dropped", len(questions) - added)
+        return bank
+
+    def fill_async(self, document_id, context, source_key):
+        """Top the bank up to target_size per question type in a background thread"""
+        if self.target_size <= 0:
+            return
+        with self._lock:
+            if document_id in self._filling:
+                return
+            self._filling.add(document_id)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="question-bank")
+        self._executor.submit(self._fill, document_id, context, source_key)
+
+    def counts(self, document_id, source_key):
+        """Banked questions by type and difficulty"""
+        bank = self._load(document_id, source_key)
+        counts = {}
+        for question in bank["questions"]:
+            by_difficulty = counts.setdefault(question["type"], {})
+            by_difficulty[question["difficulty"]] = by_difficulty.get(question["difficulty"], 0) + 1
+        return counts
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["filling"] = len(self._filling)
+        return metrics
+
+    def _fill(self, document_id, context, source_key):
+        try:
+            with tracer.span("question_bank.fill"):
+                self._count("fills")
+                for quiz_type in QUESTION_TYPES:
+                    bank = self._load(document_id, source_key)
+                    if quiz_type in bank["exhausted"]:
+                        continue
+                    while self._available(bank, quiz_type) < self.target_size:
+                        generated = self.generate(context, quiz_type, self.batch_size)
+                        before = self._available(bank, quiz_type)
+                        bank = self.add(document_id, source_key, generated, exhausted_type=quiz_type)
+                        if self._available(bank, quiz_type) == before:
+                            break
+        except Exception:
+            self._count("fill_failures")
+        finally:
+            with self._lock:
+                self._filling.discard(document_id)
+
+    def _write_lock(self, document_id):
+        return self._write_locks[hash(document_id) % len(self._write_locks)]
+
+    def _load(self, document_id, source_key):
+        bank = self.document_store.get_field(document_id, self.field)
+        if not bank or bank.get("source_key") != source_key:
+            return {"source_key": source_key, "questions": [], "exhausted": []}
+        return bank
+
+    def _sample(self, bank, quiz_type, count, rng=None):
+        rng = rng or random.Random()
+        if quiz_type in QUESTION_TYPES:
+            return self._sample_type(bank, quiz_type, count, rng)
+
+        mcq_count = round(count * MIXED_MCQ_SHARE)
+        questions = self._sample_type(bank, "mcq", mcq_count, rng)
+        questions += self._sample_type(bank, "true_false", count - len(questions), rng)
+        if len(questions) < count:
+            # Not enough true/false questions: use more MCQs instead
+            chosen = {id(question) for question in questions}
+            extra = [q for q in self._sample_type(bank, "mcq", count, rng) if id(q) not in chosen]
+            questions += extra[:count - len(questions)]
+        rng.shuffle(questions)
+        return questions
+
+    def _sample_type(self, bank, quiz_type, count, rng):
+        """Up to count questions of a type, alternating between difficulties"""
+        by_difficulty = {difficulty: [] for difficulty in DIFFICULTIES}
+        for question in bank["questions"]:
+            if question["type"] == quiz_type:
+                by_difficulty[question["difficulty"]].append(question)
+        queues = [questions for questions in by_difficulty.values() if questions]
+        for questions in queues:
+            rng.shuffle(questions)
+
+        sampled = []
+        while queues and len(sampled) < count:
+            for questions in list(queues):
+                if len(sampled) >= count:
+                    break
+                sampled.append(questions.pop())
+                if not questions:
+                    queues.remove(questions)
+        return sampled
+
+    def _available(self, bank, quiz_type):
+        return sum(1 for question in bank["questions"] if question["type"] == quiz_type)
+
+    def _runs_low(self, bank, quiz_type):
+        types = [quiz_type] if quiz_type in QUESTION_TYPES else list(QUESTION_TYPES)
+        return any(
+            quiz_type not in bank["exhausted"] and self._available(bank, quiz_type) < self.target_size // 2
+            for quiz_type in types
+        )
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._metrics[name] += amount
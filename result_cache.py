@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def hash_content(content):
+    """SHA-256 hex digest of bytes or text"""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(stage, content, model=None, prompt_version=None, content_hash=None, **params):
+    """Build a cache key from a content hash plus the stage, model, prompt version and parameters"""
+    if content_hash is None:
+        content_hash = hash_content(content)
+    extra = json.dumps(params, sort_keys=True, default=str)
+    return f"{stage}:{model or '-'}:{prompt_version or '-'}:{content_hash}:{hashlib.sha256(extra.encode('utf-8')).hexdigest()[:16]}"
+
+
+class ResultCache:
+    """Two-tier (in-memory LRU + SQLite) cache for JSON-serializable stage results.
+
+    Only the memory tier and the counters are guarded by the cache lock;
+    SQLite is used through one connection per thread, outside it. The disk
+    tier's size is kept as a running total rather than summed on every
+    write, a row's accessed_at is only rewritten once it is touch_interval
+    seconds old, and expired rows are swept at most every sweep_interval.
+
+    disk_max_bytes applies to the file as a whole, shared by all worker
+    processes: the total is re-read from the table on every sweep and
+    eviction. Each process only sees its own writes in between, so the
+    file can overshoot the cap by what other workers wrote in the last
+    sweep_interval.
+    """
+
+    def __init__(self, memory_max_bytes=64 * 1024 * 1024, disk_path=None,
+                 disk_max_bytes=512 * 1024 * 1024, ttl=24 * 3600, enabled=True,
+                 touch_interval=60, sweep_interval=60):
+        self.enabled = enabled
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, size, value)
+        self._memory_bytes = 0
+        self._local = threading.local()
+        self._disk_pid = None
+        self._disk_bytes = 0
+        self._next_sweep = 0.0
+
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "errors": 0,
+        }
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, size, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return json.loads(value)
+                self._drop_memory(key)
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._memory_put(key, value, now)
+        return json.loads(value)
+
+    def set(self, key, value):
+        """Store a JSON-serializable value under key in both tiers"""
+        if not self.enabled:
+            return
+
+        try:
+            serialized = json.dumps(value)
+        except (TypeError, ValueError):
+            return
+
+        now = time.time()
+        with self._lock:
+            self._counters["sets"] += 1
+            self._memory_put(key, serialized, now)
+        self._disk_put(key, serialized, now)
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+            stats["disk_bytes"] = self._disk_bytes
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            return stats
+
+    # ---- memory tier ----
+
+    def _memory_put(self, key, serialized, now):
+        size = len(serialized)
+        if size > self.memory_max_bytes:
+            return
+        if key in self._memory:
+            self._drop_memory(key)
+        self._memory[key] = (now + self.ttl, size, serialized)
+        self._memory_bytes += size
+
+        while self._memory_bytes > self.memory_max_bytes:
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+            self._counters["memory_evictions"] += 1
+
+    def _drop_memory(self, key):
+        _, size, _ = self._memory.pop(key)
+        self._memory_bytes -= size
+
+    # ---- disk tier ----
+
+    def _connection(self):
+        if not self.disk_path:
+            return None
+        pid = os.getpid()
+        with self._lock:
+            # SQLite connections must not be shared across forked workers
+            if self._disk_pid != pid:
+                self._open_disk()
+                self._disk_pid = pid
+        if getattr(self._local, "pid", None) != pid:
+            self._local.db = sqlite3.connect(self.disk_path)
+            self._local.pid = pid
+        return self._local.db
+
+    def _open_disk(self):
+        """Create the schema and load the running size total, once per process"""
+        directory = os.path.dirname(self.disk_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.disk_path)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+            db.commit()
+            self._disk_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        finally:
+            db.close()
+
+    def _disk_get(self, key, now):
+        db = None
+        try:
+            db = self._connection()
+            if db is None:
+                return None
+            row = db.execute("SELECT value, size, expires_at, accessed_at FROM results WHERE key = ?",
+                             (key,)).fetchone()
+            if row is None:
+                return None
+            value, size, expires_at, accessed_at = row
+            if expires_at <= now:
+                if db.execute("DELETE FROM results WHERE key = ?", (key,)).rowcount:
+                    self._add_disk_bytes(-size)
+                db.commit()
+                return None
+            # Recency only matters to eviction order, which tolerates being a little stale
+            if now - accessed_at >= self.touch_interval:
+                db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                db.commit()
+            return value
+        except sqlite3.Error:
+            self._disk_failed(db)
+            return None
+
+    def _disk_put(self, key, serialized, now):
+        db = None
+        try:
+            db = self._connection()
+            if db is None:
+                return
+            # Take the write lock first so the replaced row's size is the one actually replaced
+            db.execute("BEGIN IMMEDIATE")
+            previous = db.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, serialized, len(serialized), now + self.ttl, now),
+            )
+            db.commit()
+            self._add_disk_bytes(len(serialized) - (previous[0] if previous else 0))
+            self._disk_evict(db, now)
+        except sqlite3.Error:
+            self._disk_failed(db)
+
+    def _disk_evict(self, db, now):
+        with self._lock:
+            sweep = now >= self._next_sweep
+            if sweep:
+                self._next_sweep = now + self.sweep_interval
+            excess = self._disk_bytes - self.disk_max_bytes
+        if not sweep and excess <= 0:
+            return
+
+        # Other worker processes write to the same file, so the running total
+        # is resynced from the table (under the write lock) whenever we evict
+        db.execute("BEGIN IMMEDIATE")
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        excess = total - self.disk_max_bytes
+        freed = evicted = 0
+        if sweep:
+            expired = db.execute("SELECT key, size FROM results WHERE expires_at <= ?", (now,)).fetchall()
+            for key, size in expired:
+                if db.execute("DELETE FROM results WHERE key = ?", (key,)).rowcount:
+                    freed += size
+                    evicted += 1
+            excess -= freed
+
+        # Drop least recently used rows until we are back under budget
+        while excess > 0:
+            rows = db.execute("SELECT key, size FROM results ORDER BY accessed_at LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                if db.execute("DELETE FROM results WHERE key = ?", (key,)).rowcount:
+                    freed += size
+                    evicted += 1
+                    excess -= size
+        db.commit()
+
+        with self._lock:
+            self._disk_bytes = total - freed
+            self._counters["disk_evictions"] += evicted
+
+    def _disk_failed(self, db):
+        """Count a failed disk operation and end its transaction, so the thread's
+        connection does not keep holding the write lock"""
+        if db is not None and db.in_transaction:
+            try:
+                db.rollback()
+            except sqlite3.Error:
+                pass
+        self._count_error()
+
+    def _add_disk_bytes(self, amount):
+        with self._lock:
+            self._disk_bytes += amount
+
+    def _count_error(self):
+        with self._lock:
+            self._counters["errors"] += 1
@@ -0,0 +1,212 @@
+import hashlib
+import math
+import random
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*)$')
+PAGE_MARKER_RE = re.compile(r'^---\s*Page\s+\d+\s*---$', re.IGNORECASE)
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from has have how i if in into is it its
+me my not of on or so that the their them then there these this to was were what when where
+which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class Chunk:
+    """A contiguous piece of a document with the headings it sits under"""
+
+    def __init__(self, index, section, text):
+        self.index = index
+        self.section = section
+        self.text = text
+        self.word_count = len(text.split())
+
+    def render(self):
+        """Chunk text prefixed with its heading path"""
+        return f"[{self.section}]\n{self.text}" if self.section else self.text
+
+
+def split_into_chunks(text, max_words=200):
+    """Split a document on markdown headings/page markers, then pack paragraphs up to max_words"""
+    chunks = []
+    headings = []
+    paragraphs = []
+    current = []
+
+    def flush_paragraph():
+        if current:
+            paragraphs.append("\n".join(current))
+            current.clear()
+
+    def flush_section():
+        flush_paragraph()
+        section = " > ".join(title for _, title in headings)
+        buffer = []
+        buffer_words = 0
+        for paragraph in paragraphs:
+            words = len(paragraph.split())
+            if buffer and buffer_words + words > max_words:
+                chunks.append(Chunk(len(chunks), section, "\n\n".join(buffer)))
+                buffer, buffer_words = [], 0
+            # Oversized paragraphs are split on word boundaries
+            if words > max_words:
+                tokens = paragraph.split()
+                for start in range(0, len(tokens), max_words):
+                    chunks.append(Chunk(len(chunks), section, " ".join(tokens[start:start + max_words])))
+                continue
+            buffer.append(paragraph)
+            buffer_words += words
+        if buffer:
+            chunks.append(Chunk(len(chunks), section, "\n\n".join(buffer)))
+        paragraphs.clear()
+
+    for line in text.split("\n"):
+        stripped = line.strip()
+        heading = HEADING_RE.match(stripped)
+        if heading:
+            flush_section()
+            level = len(heading.group(1))
+            headings[:] = [(lvl, title) for lvl, title in headings if lvl < level]
+            headings.append((level, heading.group(2).strip()))
+        elif PAGE_MARKER_RE.match(stripped):
+            flush_section()
+        elif not stripped:
+            flush_paragraph()
+        else:
+            current.append(stripped)
+    flush_section()
+
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over document chunks, stored as per-term NumPy postings"""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for chunk in chunks:
+            tokens = tokenize(chunk.render())
+            lengths[chunk.index] = len(tokens)
+            counts = defaultdict(int)
+            for token in tokens:
+                counts[token] += 1
+            for token, count in counts.items():
+                postings[token][0].append(chunk.index)
+                postings[token][1].append(count)
+
+        self.doc_lengths = lengths
+        self.avg_length = float(lengths.mean()) if len(chunks) else 0.0
+        n = len(chunks)
+        self.postings = {}
+        for token, (doc_ids, tfs) in postings.items():
+            idf = math.log(1 + (n - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            self.postings[token] = (np.asarray(doc_ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32), idf)
+
+    def scores(self, query):
+        """BM25 score of every chunk for the query"""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        if not self.chunks or self.avg_length == 0:
+            return scores
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / self.avg_length)
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            doc_ids, tfs, idf = self.postings[token]
+            scores[doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + norm[doc_ids])
+        return scores
+
+    def top_chunks(self, query, max_words):
+        """Highest-scoring chunks that fit in max_words, returned in document order"""
+        scores = self.scores(query)
+        # Stable sort keeps document order among equal scores (e.g. no matches)
+        ranked = np.argsort(-scores, kind="stable")
+        return _fill_budget((self.chunks[i] for i in ranked), max_words)
+
+    def coverage_sample(self, max_words, seed=None):
+        """Chunks sampled round-robin across sections so every section is represented"""
+        rng = random.Random(seed)
+        sections = OrderedDict()
+        for chunk in self.chunks:
+            sections.setdefault(chunk.section, []).append(chunk)
+        for section_chunks in sections.values():
+            rng.shuffle(section_chunks)
+
+        interleaved = []
+        queues = list(sections.values())
+        rng.shuffle(queues)
+        while queues:
+            for queue in list(queues):
+                interleaved.append(queue.pop())
+                if not queue:
+                    queues.remove(queue)
+        return _fill_budget(interleaved, max_words)
+
+
+def _fill_budget(chunks, max_words):
+    selected = []
+    used = 0
+    for chunk in chunks:
+        if used + chunk.word_count > max_words:
+            continue
+        selected.append(chunk)
+        used += chunk.word_count
+    return sorted(selected, key=lambda chunk: chunk.index)
+
+
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+INDEX_CACHE_SIZE = 32
+
+
+def get_index(text):
+    """Return the BM25 index for a document, building it once per document hash"""
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    with _index_cache_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+
+    index = BM25Index(split_into_chunks(text))
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def render_chunks(chunks):
+    """Join selected chunks into a prompt context, marking omitted material"""
+    return "\n\n[...]\n\n".join(chunk.render() for chunk in chunks)
+
+
+def select_relevant_context(text, query, max_words):
+    """Return the whole document if it fits, otherwise its most relevant chunks"""
+    if len(text.split()) <= max_words:
+        return text
+    chunks = get_index(text).top_chunks(query, max_words)
+    return render_chunks(chunks) if chunks else text
+
+
+def select_coverage_context(text, max_words, seed=None):
+    """Return the whole document if it fits, otherwise a section-balanced sample"""
+    if len(text.split()) <= max_words:
+        return text
+    chunks = get_index(text).coverage_sample(max_words, seed=seed)
+    return render_chunks(chunks) if chunks else text
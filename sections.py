@@ -0,0 +1,109 @@
+import hashlib
+
+from retrieval import HEADING_RE, PAGE_MARKER_RE, BM25Index, Chunk
+
+
+class Section:
+    """A run of document lines between headings/page markers, identified by a content hash"""
+
+    def __init__(self, index, heading, text):
+        self.index = index
+        self.heading = heading
+        self.text = text
+        self.hash = hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()[:16]
+        self.word_count = len(text.split())
+
+
+def split_sections(text, max_words=1500):
+    """Split text at markdown headings and page markers into sections.
+
+    Consecutive small sections are packed together up to max_words so a
+    long document does not become one LLM call per heading. Where a pack
+    ends depends on the content of the segment it ends with (see
+    _is_anchor), not on how many words came before, so an edit that grows
+    or shrinks one part of the document only moves the pack boundaries
+    around it: the other sections usually keep their hashes. Whitespace-only
+    changes keep a section's hash.
+    """
+    segments = []
+    current = []
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if (HEADING_RE.match(stripped) or PAGE_MARKER_RE.match(stripped)) and any(l.strip() for l in current):
+            segments.append("\n".join(current))
+            current = []
+        current.append(line)
+    if any(l.strip() for l in current):
+        segments.append("\n".join(current))
+    elif segments and current:
+        segments[-1] += "\n" + "\n".join(current)
+
+    sections = []
+    packed = []
+    packed_words = 0
+    for segment in segments:
+        words = len(segment.split())
+        if packed and packed_words + words > max_words:
+            sections.append(_make_section(len(sections), packed))
+            packed, packed_words = [], 0
+        packed.append(segment)
+        packed_words += words
+        if _is_anchor(segment, words, max_words):
+            sections.append(_make_section(len(sections), packed))
+            packed, packed_words = [], 0
+    if packed:
+        sections.append(_make_section(len(sections), packed))
+    return sections
+
+
+def _is_anchor(segment, words, max_words):
+    """Whether a pack ends after this segment, decided by the segment's own content.
+
+    The segment's hash is compared with its share of half of max_words, so
+    packs average about half of max_words and seldom reach the hard cap,
+    whose cut points do depend on where the pack started.
+    """
+    digest = hashlib.sha256(" ".join(segment.split()).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64 < words / (max_words / 2)
+
+
+def _make_section(index, segments):
+    text = "\n".join(segments)
+    heading = None
+    for line in text.split("\n"):
+        match = HEADING_RE.match(line.strip())
+        if match:
+            heading = match.group(2).strip()
+            break
+    return Section(index, heading, text)
+
+
+def attribute_items(item_texts, sections):
+    """Return, for each item text, the hash of the section it most likely came from"""
+    if not sections:
+        return [None] * len(item_texts)
+    if len(sections) == 1:
+        return [sections[0].hash] * len(item_texts)
+    index = BM25Index([Chunk(i, section.heading or "", section.text) for i, section in enumerate(sections)])
+    owners = []
+    for text in item_texts:
+        scores = index.scores(text)
+        owners.append(sections[int(scores.argmax())].hash)
+    return owners
+
+
+def merge_items(previous_items, previous_owners, new_items, new_owners, sections, limit, changed_count):
+    """Combine items from unchanged sections with items regenerated for changed sections.
+
+    Items owned by sections that no longer exist are dropped. At most as
+    many new items as were dropped (but at least one per changed section)
+    are added. The result is ordered by section and capped at limit.
+    Returns (items, owners).
+    """
+    order = {section.hash: section.index for section in sections}
+    kept = [(item, owner) for item, owner in zip(previous_items, previous_owners) if owner in order]
+    dropped = len(previous_items) - len(kept)
+    added = list(zip(new_items, new_owners))[:max(dropped, changed_count)]
+
+    merged = sorted(kept + added, key=lambda pair: order.get(pair[1], len(order)))[:limit]
+    return [item for item, _ in merged], [owner for _, owner in merged]
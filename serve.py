@@ -0,0 +1,35 @@
+"""Start the Ylearn API server.
+
+    python serve.py          # production: gunicorn with gunicorn.conf.py
+    python serve.py --dev    # Flask development server with the reloader
+
+Extra arguments are passed through to gunicorn, e.g.
+`python serve.py --workers 2 --threads 32`. Settings can also be given as
+environment variables (WEB_WORKERS, WEB_THREADS, PORT, ...), see
+gunicorn.conf.py.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    args = sys.argv[1:]
+    if "--dev" in args:
+        sys.path.insert(0, ROOT)
+        from server import app
+        app.run(debug=True, port=int(os.getenv("PORT", "5000")))
+        return
+
+    try:
+        from gunicorn.app.wsgiapp import run
+    except ImportError:
+        sys.exit("gunicorn is not installed (pip install -r requirements.txt); use --dev for the development server")
+
+    sys.argv = ["gunicorn", "--config", os.path.join(ROOT, "gunicorn.conf.py"), "--chdir", ROOT, *args, "server:app"]
+    run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,212 @@
 import os
 import json
-from flask import Flask, request, jsonify, send_from_directory
-from google.cloud import vision
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, g
 from dotenv import load_dotenv
-import google.generativeai as genai  # Gemini
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import fitz  # PyMuPDF for PDF processing
-from PIL import Image
 import io
 import re
+import shutil
+import time
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from ocr_batcher import OCRBatcher
+from result_cache import ResultCache, make_key, hash_content, hash_file
+from single_flight import SingleFlight
+from stage_graph import Stage, run_stage_graph
+from retrieval import select_relevant_context, select_coverage_context
+from document_store import DocumentStore
+from jobs import JobManager, QueueFull
+from image_preprocess import ImagePreprocessor
+from llm_client import LLMClient, GeminiBackend, FakeBackend, estimate_tokens
+from tracing import tracer
+from clients import ClientProvider
+from sections import split_sections, attribute_items, merge_items
+from basic_markdown import basic_text_to_markdown, clean_markdown_formatting
+from chunking import split_windows, map_windows
+from prompts import PromptBuilder, PromptBudget
+from question_bank import QuestionBank
+from json_extract import JSONExtractor
 
 # Load .env
 load_dotenv()
 
-# Gemini setup
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")  # Using stable model
+
+def create_vision_client():
+    # Reads GOOGLE_APPLICATION_CREDENTIALS
+    from google.cloud import vision
+    return vision.ImageAnnotatorClient()
+
+def create_gemini_client():
+    import google.generativeai as genai  # Gemini
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai
+
+def check_gemini_client(genai):
+    genai.get_model(f"models/{GEMINI_MODEL}")
+
+# Google clients are built on first use in each process, not at import time
+clients = ClientProvider()
+clients.register("vision", create_vision_client)
+clients.register("gemini", create_gemini_client, health_check=check_gemini_client)
+
+# Shared Gemini client: one model instance, client-side rate limits (0 turns a
+# limit off), retries with backoff, per-call deadlines and a circuit breaker.
+# LLM_BACKEND=fake answers offline with empty responses.
+llm = LLMClient(
+    FakeBackend() if os.getenv("LLM_BACKEND") == "fake" else GeminiBackend(lambda: clients.get("gemini")),
+    GEMINI_MODEL,
+    requests_per_minute=int(os.getenv("GEMINI_RPM", "60")),
+    tokens_per_minute=int(os.getenv("GEMINI_TPM", "1000000")),
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+    deadline=float(os.getenv("GEMINI_DEADLINE_SECONDS", "120")),
+    failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30")),
+)
+
+# Bump whenever a prompt changes so cached Gemini results are not reused
+PROMPT_VERSION = "2"
 
 app = Flask(__name__)
 CORS(app)  # ✅ allow all origins by default
 
-# Vision client (reads GOOGLE_APPLICATION_CREDENTIALS env var)
-vision_client = vision.ImageAnnotatorClient()
+# Stage timings for /metrics; SERVER_TIMING=1 also reports them per response
+tracer.enabled = os.getenv("TRACING_ENABLED", "1") == "1"
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+# Stored documents and the result cache live here. The app serves static
+# files from its own directory, so this must be somewhere outside it.
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.expanduser("~"), ".local", "share", "ylearn"))
+
+# Uploads are streamed to disk in chunks of this size instead of read whole
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Maximum number of pages OCR'd concurrently per PDF; also bounds how many
+# rendered page images are held in memory at once
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "8"))
+
+# Page rasterization for OCR: pages are scaled to roughly OCR_TARGET_PIXELS
+# (about 2x zoom for a Letter page) within the zoom limits, rendered in
+# grayscale and encoded as PNG or JPEG. See benchmarks/raster_settings.py.
+OCR_TARGET_PIXELS = int(os.getenv("OCR_TARGET_PIXELS", str(2_000_000)))
+OCR_MIN_ZOOM = float(os.getenv("OCR_MIN_ZOOM", "1.0"))
+OCR_MAX_ZOOM = float(os.getenv("OCR_MAX_ZOOM", "3.0"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "1") == "1"
+OCR_IMAGE_FORMAT = os.getenv("OCR_IMAGE_FORMAT", "png").lower()
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "85"))
+
+# Pages with an embedded text layer of at least this many characters skip OCR
+PDF_USE_TEXT_LAYER = os.getenv("PDF_USE_TEXT_LAYER", "1") == "1"
+PDF_TEXT_LAYER_MIN_CHARS = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "50"))
+
+# Shared OCR batcher: pages and images from concurrent uploads are grouped
+# into batch_annotate_images calls
+ocr_batcher = OCRBatcher(
+    client_factory=lambda: clients.get("vision"),
+    max_batch_size=int(os.getenv("OCR_BATCH_SIZE", "8")),
+    max_wait=float(os.getenv("OCR_BATCH_WAIT_MS", "50")) / 1000,
+    max_concurrent_batches=int(os.getenv("OCR_MAX_CONCURRENT_BATCHES", "4")),
+)
+
+# Image uploads are cleaned up before OCR (EXIF rotation, downscaling to
+# IMAGE_MAX_PIXELS, grayscale, contrast, optional deskew) in worker processes;
+# an image not done within IMAGE_PREPROCESS_TIMEOUT seconds is processed inline
+image_preprocessor = ImagePreprocessor(
+    max_workers=int(os.getenv("IMAGE_PREPROCESS_WORKERS", "2")),
+    enabled=os.getenv("IMAGE_PREPROCESS", "1") == "1",
+    timeout=float(os.getenv("IMAGE_PREPROCESS_TIMEOUT", "30")),
+    max_pixels=int(os.getenv("IMAGE_MAX_PIXELS", str(4_000_000))),
+    grayscale=os.getenv("IMAGE_GRAYSCALE", "1") == "1",
+    autocontrast=os.getenv("IMAGE_AUTOCONTRAST", "1") == "1",
+    deskew=os.getenv("IMAGE_DESKEW", "0") == "1",
+    jpeg_quality=int(os.getenv("IMAGE_JPEG_QUALITY", "85")),
+)
+
+# Per-stage deadline for the Gemini calls in /api/process-corrected-text
+STAGE_TIMEOUT_SECONDS = float(os.getenv("STAGE_TIMEOUT_SECONDS", "90"))
+
+# "separate" makes one Gemini call per study artifact, "combined" asks for all
+# of them in a single JSON document (overridable per request with "mode")
+STUDY_MATERIALS_MODE = os.getenv("STUDY_MATERIALS_MODE", "separate")
+
+# Resubmitted text is split into sections (packed up to SECTION_MAX_WORDS) and
+# only changed sections are sent to Gemini again, unless more than
+# INCREMENTAL_MAX_CHANGED of them changed
+INCREMENTAL_PROCESSING = os.getenv("INCREMENTAL_PROCESSING", "1") == "1"
+INCREMENTAL_MAX_CHANGED = float(os.getenv("INCREMENTAL_MAX_CHANGED", "0.5"))
+SECTION_MAX_WORDS = int(os.getenv("SECTION_MAX_WORDS", "1500"))
+SECTION_MARKDOWN_WORKERS = int(os.getenv("SECTION_MARKDOWN_WORKERS", "4"))
+
+# Text over CHUNK_MAX_TOKENS (estimated) is corrected/converted in windows of
+# that size, each repeating CHUNK_OVERLAP_TOKENS of the previous one as
+# context, CHUNK_WORKERS at a time. 0 sends every document in one prompt.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "3000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "100"))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "4"))
+
+# Documents longer than this many words are narrowed down to the most relevant
+# chunks (chat) or a section-balanced sample (quiz) before prompting Gemini
+CHAT_CONTEXT_WORDS = int(os.getenv("CHAT_CONTEXT_WORDS", "3000"))
+QUIZ_CONTEXT_WORDS = int(os.getenv("QUIZ_CONTEXT_WORDS", "4000"))
+
+# Text interpolated into prompts is compacted (whitespace, and for everything
+# but correction/markdown also page markers and OCR specks). Study-material
+# prompts keep a section-balanced sample when the text is over
+# PROMPT_INPUT_TOKENS; correction/markdown are chunked instead and quiz/chat
+# are already narrowed down above.
+PROMPT_INPUT_TOKENS = int(os.getenv("PROMPT_INPUT_TOKENS", "8000"))
+prompt_builder = PromptBuilder({
+    "correct": PromptBudget(drop_noise=False),
+    "markdown": PromptBudget(drop_noise=False),
+    **{
+        kind: PromptBudget(PROMPT_INPUT_TOKENS, "coverage")
+        for kind in ("key_points", "flashcards", "mindmap", "flashcards_formatted", "mindmap_formatted", "study_materials")
+    },
+})
+
+# Processed documents, so chat/quiz requests can send a document_id instead
+# of the full study text
+document_store = DocumentStore(
+    os.getenv("DOCUMENT_STORE_PATH", os.path.join(DATA_DIR, "documents.sqlite3")),
+    ttl=int(os.getenv("DOCUMENT_TTL", str(30 * 24 * 3600))),
+)
+
+# Tolerant parsing of Gemini's JSON answers, with per-artifact fallback counts
+llm_json = JSONExtractor()
+
+# Quiz questions are banked per document: filled in the background after a
+# document is processed and topped up when a question type drops below half
+# of QUIZ_BANK_SIZE, so retakes are served without a Gemini call. 0 disables.
+QUIZ_BANK_SIZE = int(os.getenv("QUIZ_BANK_SIZE", "20"))
+question_bank = QuestionBank(
+    document_store,
+    generate=lambda context, quiz_type, count: generate_quiz_questions(context, quiz_type, count),
+    target_size=QUIZ_BANK_SIZE,
+    batch_size=int(os.getenv("QUIZ_BANK_BATCH", "10")),
+    max_workers=int(os.getenv("QUIZ_BANK_WORKERS", "1")),
+)
+
+# Background jobs for long OCR/processing runs
+job_manager = JobManager(
+    max_workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_QUEUE_SIZE", "32")),
+    result_ttl=int(os.getenv("JOB_RESULT_TTL", "3600")),
+)
+
+# Content-addressed cache for OCR and Gemini stage results
+result_cache = ResultCache(
+    memory_max_bytes=int(os.getenv("RESULT_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+    disk_path=os.getenv("RESULT_CACHE_PATH", os.path.join(DATA_DIR, "results.sqlite3")) or None,
+    disk_max_bytes=int(os.getenv("RESULT_CACHE_DISK_MB", "512")) * 1024 * 1024,
+    ttl=int(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600))),
+    enabled=os.getenv("RESULT_CACHE_ENABLED", "1") == "1",
+)
+
+# Concurrent identical OCR runs and Gemini prompts (same content hash and
+# parameters, e.g. a class uploading the same handout) share one upstream call
+in_flight = SingleFlight(enabled=os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1")
 
 # ------------------ OCR + Correction (Images & PDFs) ------------------
 @app.route("/api/ocr", methods=["POST"])
@@ -30,25 +215,116 @@ def ocr_and_correct():
         return jsonify({"error": "No file uploaded"}), 400
     
     file = request.files["file"]
-    file_content = file.read()
     filename = file.filename.lower()
+    upload_path = spool_upload(file)
     
+    try:
+        return jsonify(run_ocr_pipeline(upload_path, filename))
+    except NoTextDetected as e:
+        error_response = {"error": str(e)}
+        if e.pages is not None:
+            error_response["pages"] = e.pages
+        return jsonify(error_response), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to process file: {str(e)}"}), 500
+    finally:
+        remove_upload(upload_path)
+
+def spool_upload(file):
+    """Stream an uploaded file to a temporary file on disk and return its path"""
+    fd, path = tempfile.mkstemp(prefix="ylearn-upload-", suffix=os.path.splitext(file.filename or "")[1])
+    try:
+        with os.fdopen(fd, "wb") as spooled:
+            shutil.copyfileobj(file.stream, spooled, UPLOAD_CHUNK_SIZE)
+    except Exception:
+        remove_upload(path)
+        raise
+    return path
+
+def remove_upload(path):
+    """Delete a spooled upload, ignoring files that are already gone"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class NoTextDetected(Exception):
+    """OCR finished but found no text; carries the per-page results for PDFs"""
+    
+    def __init__(self, pages=None):
+        super().__init__("No text detected in the file")
+        self.pages = pages
+
+def run_ocr_pipeline(upload_path, filename, job=None):
+    """OCR an uploaded image or PDF (spooled at upload_path), correct it and store it as a new document"""
     all_text = ""
+    pages = None
+    preprocessing = None
     
-    try:
-        if filename.endswith('.pdf'):
-            # Handle PDF files
-            all_text = process_pdf(file_content)
-        else:
-            # Handle image files
-            all_text = process_image(file_content)
-            
-        if not all_text.strip():
-            return jsonify({"error": "No text detected in the file"}), 400
-            
-        # Enhanced Gemini correction with better prompt
-        model = genai.GenerativeModel("gemini-1.5-pro")  # Using stable model
-        prompt = f"""You are an expert at correcting OCR output from handwritten academic notes. Your task is to:
+    on_page = None
+    if job:
+        on_page = lambda done, total: job.report(stage="ocr", pages_done=done, pages_total=total)
+    
+    if filename.endswith('.pdf'):
+        # Handle PDF files
+        all_text, pages = process_pdf(upload_path, on_page=on_page)
+    else:
+        # Handle image files
+        with open(upload_path, "rb") as image_file:
+            all_text, preprocessing = process_image(image_file.read())
+    
+    if not all_text.strip():
+        raise NoTextDetected(pages)
+    
+    if job:
+        job.stage_completed("ocr")
+        job.report(stage="correction")
+    
+    corrected_text = correct_ocr_text(all_text)
+    
+    if job:
+        job.stage_completed("correction")
+    
+    file_type = "pdf" if filename.endswith('.pdf') else "image"
+    document_id = document_store.create({
+        "text": corrected_text.strip(),
+        "file_type": file_type
+    })
+    
+    result = {
+        "corrected_text": corrected_text.strip(),
+        "file_type": file_type,
+        "document_id": document_id
+    }
+    if pages is not None:
+        result["pages"] = pages
+    if preprocessing is not None:
+        result["preprocessing"] = preprocessing
+    
+    return result
+
+@tracer.traced("gemini.correct")
+def correct_ocr_text(all_text):
+    """Fix OCR mistakes with Gemini, falling back to the raw text.
+    
+    Long text is corrected in overlapping windows in parallel; a window
+    whose call fails keeps its raw text.
+    """
+    if is_oversized(all_text):
+        return run_chunked("correct", all_text, request_ocr_correction, lambda text: text)
+    return request_ocr_correction(all_text) or all_text
+
+def request_ocr_correction(all_text):
+    """Gemini's correction of the text (cached), or an empty string if it returned nothing"""
+    cache_key = make_key("correct", all_text, model=GEMINI_MODEL, prompt_version=PROMPT_VERSION)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    material = prompt_builder.prepare("correct", all_text)
+    
+    # Enhanced Gemini correction with better prompt
+    prompt = f"""You are an expert at correcting OCR output from handwritten academic notes. Your task is to:
 
 1. Fix spelling errors and OCR mistakes
 2. Complete incomplete words based on context
@@ -59,65 +335,226 @@ def ocr_and_correct():
 
 OCR Text to correct:
 ---
-{all_text}
+{material.text}
 ---
 
 Return ONLY the corrected text with proper formatting. Do not add explanations or comments."""
+
+    corrected = generate_prompt(material, prompt)
+    if corrected:
+        result_cache.set(cache_key, corrected)
+    return corrected
+
+def is_oversized(text):
+    """Whether text should be split into windows rather than sent in one prompt"""
+    return CHUNK_MAX_TOKENS > 0 and estimate_tokens(text) > CHUNK_MAX_TOKENS
+
+def run_chunked(name, text, convert, fallback):
+    """Map convert over overlapping windows of text in parallel and stitch the outputs back together"""
+    windows = split_windows(text, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+    with tracer.span(f"chunked.{name}") as span:
+        stitched, failed = map_windows(windows, convert, fallback, CHUNK_WORKERS)
+        span.set(windows=len(windows), failed_windows=failed)
+    return stitched
+
+def generate_prompt(material, prompt, generation_config=None):
+    """Send a prompt built around prepared material to Gemini, recording estimated and actual token counts.
+    
+    Identical prompts sent concurrently wait on a single Gemini call.
+    """
+    key = make_key(material.kind, prompt, model=GEMINI_MODEL, generation_config=generation_config)
+    return in_flight.run(key, send_prompt, material, prompt, generation_config)
+
+def send_prompt(material, prompt, generation_config=None):
+    response_text = llm.generate(prompt, generation_config=generation_config)
+    prompt_builder.record(material, prompt, llm.last_usage())
+    return response_text
+
+@tracer.traced("ocr.pdf")
+def process_pdf(pdf_source, max_workers=None, batcher=None, on_page=None):
+    """Extract text from PDF pages using OCR, returning the text and per-page results.
+    
+    pdf_source is either the PDF bytes or a path to a PDF on disk; paths are
+    read page by page so large uploads never sit in memory as a whole.
+    """
+    if isinstance(pdf_source, (bytes, bytearray)):
+        content_hash = hash_content(pdf_source)
+    else:
+        content_hash = hash_file(pdf_source)
+    cache_key = make_key("ocr_pdf", None, content_hash=content_hash,
+                         text_layer=PDF_USE_TEXT_LAYER, min_chars=PDF_TEXT_LAYER_MIN_CHARS,
+                         raster=[OCR_TARGET_PIXELS, OCR_MIN_ZOOM, OCR_MAX_ZOOM, OCR_GRAYSCALE,
+                                 OCR_IMAGE_FORMAT, OCR_JPEG_QUALITY])
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached[0], cached[1]
+    # Concurrent uploads of the same PDF wait for the first one's OCR; each
+    # caller still gets page progress, and cancelling one job leaves the others running
+    return in_flight.run(cache_key, ocr_pdf, pdf_source, cache_key, max_workers, batcher,
+                         progress=True, listener=on_page)
+
+def ocr_pdf(pdf_source, cache_key, max_workers=None, batcher=None, on_progress=None):
+    """OCR a PDF that is not in the result cache, caching the outcome if every page succeeded"""
+    import fitz  # PyMuPDF, loaded with the first PDF rather than at startup
+    
+    try:
+        if isinstance(pdf_source, (bytes, bytearray)):
+            # Open PDF from bytes
+            pdf_document = fitz.open(stream=pdf_source, filetype="pdf")
+        else:
+            pdf_document = fitz.open(pdf_source, filetype="pdf")
+    except Exception as e:
+        raise Exception(f"PDF processing failed: {str(e)}")
+    
+    try:
+        page_results = ocr_pdf_pages(pdf_document, max_workers=max_workers, batcher=batcher, on_page=on_progress)
+    except Exception as e:
+        raise Exception(f"PDF processing failed: {str(e)}")
+    finally:
+        pdf_document.close()
+    
+    text_parts = [
+        f"\n--- Page {result['page']} ---\n{result['text']}\n"
+        for result in page_results
+        if not result["error"] and result["text"].strip()
+    ]
+    all_text = "".join(text_parts)
+    
+    # Pages that failed may succeed on a retry, so only cache clean runs
+    if not any(result["error"] for result in page_results):
+        result_cache.set(cache_key, [all_text, page_results])
+    return all_text, page_results
+
+def ocr_pdf_pages(pdf_document, max_workers=None, batcher=None, on_page=None):
+    """Render pages and OCR them concurrently, returning results in page order.
+    
+    on_page(pages_done, pages_total) is called as each page result is collected.
+    """
+    batcher = batcher or ocr_batcher
+    max_in_flight = max(1, max_workers or OCR_MAX_WORKERS)
+    total_pages = len(pdf_document)
+    
+    def collect(entry):
+        page_results.append(collect_page_result(*entry))
+        if on_page:
+            on_page(len(page_results), total_pages)
+    
+    # Rendering stays on this thread (MuPDF documents are not thread-safe),
+    # only the Vision round-trips are handed to the batcher
+    pending = deque()
+    page_results = []
+    for page_num in range(total_pages):
+        if len(pending) >= max_in_flight:
+            collect(pending.popleft())
         
-        gemini_response = model.generate_content(prompt)
-        corrected_text = gemini_response.text if gemini_response and gemini_response.text else all_text
+        page = pdf_document.load_page(page_num)
         
-        return jsonify({
-            "corrected_text": corrected_text.strip(),
-            "file_type": "pdf" if filename.endswith('.pdf') else "image"
-        })
+        # Born-digital pages already carry their text, no need to OCR them
+        with tracer.span("pdf.text_layer"):
+            page_text = extract_text_layer(page)
+        if page_text is not None:
+            pending.append((page_num + 1, None, page_text))
+            continue
         
-    except Exception as e:
-        return jsonify({"error": f"Failed to process file: {str(e)}"}), 500
-
-def process_pdf(file_content):
-    """Extract text from PDF pages using OCR"""
+        with tracer.span("pdf.render_page") as span:
+            img_data = render_page_image(page)
+            span.set(bytes=len(img_data))
+        pending.append((page_num + 1, batcher.submit(img_data), None))
+    
+    while pending:
+        collect(pending.popleft())
+    
+    return page_results
+
+def render_page_image(page, target_pixels=None, grayscale=None, image_format=None, jpeg_quality=None):
+    """Rasterize a PDF page for OCR.
+    
+    The zoom is chosen so the image lands near target_pixels regardless of
+    the page size, instead of a fixed 2x that turns large pages into
+    multi-megabyte payloads.
+    """
+    target_pixels = target_pixels or OCR_TARGET_PIXELS
+    grayscale = OCR_GRAYSCALE if grayscale is None else grayscale
+    image_format = image_format or OCR_IMAGE_FORMAT
+    jpeg_quality = jpeg_quality or OCR_JPEG_QUALITY
+    
+    import fitz
+    
+    zoom = page_zoom(page.rect.width, page.rect.height, target_pixels)
+    mat = fitz.Matrix(zoom, zoom)
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    pix = page.get_pixmap(matrix=mat, colorspace=colorspace, alpha=False)
+    
+    if image_format == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=jpeg_quality)
+    return pix.tobytes("png")
+
+def page_zoom(width, height, target_pixels):
+    """Zoom factor that scales a page of width x height points to about target_pixels"""
+    area = max(width * height, 1.0)
+    zoom = (target_pixels / area) ** 0.5
+    return min(max(zoom, OCR_MIN_ZOOM), OCR_MAX_ZOOM)
+
+def extract_text_layer(page):
+    """Return the page's embedded text if it has a usable text layer, else None"""
+    if not PDF_USE_TEXT_LAYER:
+        return None
+    
+    page_text = page.get_text()
+    stripped = page_text.strip()
+    if len(stripped) < PDF_TEXT_LAYER_MIN_CHARS:
+        return None
+    
+    # Broken font encodings come out as replacement characters or symbol soup
+    readable = sum(1 for c in stripped if c.isalnum() or c.isspace())
+    if '\ufffd' in stripped or readable / len(stripped) < 0.6:
+        return None
+    
+    return page_text
+
+def collect_page_result(page_number, future, page_text):
+    """Wait for a page's OCR response, reporting errors instead of raising"""
+    if future is None:
+        return {"page": page_number, "text": page_text, "error": None, "method": "text_layer"}
+    
     try:
-        # Open PDF from bytes
-        pdf_document = fitz.open(stream=file_content, filetype="pdf")
-        all_text = ""
-        
-        for page_num in range(len(pdf_document)):
-            page = pdf_document.load_page(page_num)
-            
-            # Convert page to image
-            mat = fitz.Matrix(2.0, 2.0)  # 2x zoom for better OCR quality
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            # OCR the page image
-            image = vision.Image(content=img_data)
-            response = vision_client.document_text_detection(image=image)
-            
-            if response.error.message:
-                continue  # Skip pages with errors
-                
-            page_text = response.full_text_annotation.text if response.full_text_annotation else ""
-            if page_text.strip():
-                all_text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
+        response = future.result()
         
-        pdf_document.close()
-        return all_text
+        if response.error.message:
+            return {"page": page_number, "text": "", "error": response.error.message, "method": "ocr"}
         
+        page_text = response.full_text_annotation.text if response.full_text_annotation else ""
+        return {"page": page_number, "text": page_text, "error": None, "method": "ocr"}
     except Exception as e:
-        raise Exception(f"PDF processing failed: {str(e)}")
-
-def process_image(file_content):
-    """Extract text from image using OCR"""
+        return {"page": page_number, "text": "", "error": str(e), "method": "ocr"}
+
+def process_image(file_content, batcher=None, preprocessor=None):
+    """Extract text from image using OCR; returns (text, preprocessing report or None)"""
+    batcher = batcher or ocr_batcher
+    preprocessor = preprocessor or image_preprocessor
+    # Keyed on the original upload so cache hits skip preprocessing as well
+    cache_key = make_key("ocr_image", file_content,
+                         preprocess=preprocessor.options if preprocessor.enabled else None)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached["text"], cached["preprocessing"]
+    return in_flight.run(cache_key, ocr_image, file_content, cache_key, batcher, preprocessor)
+
+def ocr_image(file_content, cache_key, batcher, preprocessor):
+    """Preprocess and OCR an image that is not in the result cache"""
     try:
+        image_content, preprocessing = preprocessor.run(file_content)
+        
         # OCR the image
-        image = vision.Image(content=file_content)
-        response = vision_client.document_text_detection(image=image)
+        with tracer.span("ocr.image", bytes=len(image_content)):
+            response = batcher.annotate(image_content)
         
         if response.error.message:
             raise Exception(f"OCR failed: {response.error.message}")
             
-        return response.full_text_annotation.text if response.full_text_annotation else ""
+        text = response.full_text_annotation.text if response.full_text_annotation else ""
+        result_cache.set(cache_key, {"text": text, "preprocessing": preprocessing})
+        return text, preprocessing
         
     except Exception as e:
         raise Exception(f"Image processing failed: {str(e)}")
@@ -131,37 +568,279 @@ def process_corrected_text():
     if not data or "text" not in data:
         return jsonify({"error": "No text provided"}), 400
     
-    corrected_text = data["text"]
-    title = data.get("title", "Study Notes")
-    
-    # ---- CONVERT TEXT TO MARKDOWN ----
-    markdown_text = convert_text_to_markdown(corrected_text)
+    return jsonify(run_study_materials_pipeline(
+        data["text"],
+        data.get("title", "Study Notes"),
+        mode=data.get("mode", STUDY_MATERIALS_MODE),
+        document_id=data.get("document_id")
+    ))
+
+def run_study_materials_pipeline(corrected_text, title, mode=None, document_id=None, job=None):
+    """Generate markdown, key points, flashcards and mindmap and store them with the document.
+    
+    The text is split into sections at headings/page markers. When the
+    stored document was processed before, unchanged sections reuse their
+    markdown and study items, and Gemini only sees the changed sections.
+    """
+    mode = mode or STUDY_MATERIALS_MODE
+    sections = split_sections(corrected_text, SECTION_MAX_WORDS)
+    
+    previous = load_previous_sections(document_id) if mode != "combined" else None
+    previous_markdown = previous["sections"]["markdown"] if previous else {}
+    changed = [section for section in sections if section.hash not in previous_markdown]
+    incremental = previous is not None and len(changed) <= len(sections) * INCREMENTAL_MAX_CHANGED
+    
+    # ---- CONVERT TEXT TO MARKDOWN ---- section by section, reusing unchanged ones
+    stages = [
+        Stage("section_markdown",
+              lambda deps: convert_sections_to_markdown(sections, previous_markdown),
+              timeout=STAGE_TIMEOUT_SECONDS,
+              fallback=lambda deps: {
+                  section.hash: previous_markdown.get(section.hash) or basic_text_to_markdown(section.text)
+                  for section in sections
+              }),
+        Stage("markdown",
+              lambda deps: "\n\n".join(deps["section_markdown"][section.hash] for section in sections),
+              deps=["section_markdown"]),
+    ]
     
-    # ---- ENHANCED BULLETS ---- using existing function
-    bullets = extract_enhanced_key_points(corrected_text)
+    if incremental:
+        stages.extend(incremental_study_stages(sections, changed, previous, title))
+    else:
+        stages.extend(full_study_stages(corrected_text, title, mode))
     
-    # ---- ENHANCED FLASHCARDS FROM FORMATTED TEXT ---- using new function
-    flashcards = generate_flashcards_from_formatted_text(markdown_text)
+    on_stage_done = job.stage_completed if job else None
+    results, _ = run_stage_graph(stages, on_stage_done=on_stage_done)
+    markdown_text = results["markdown"]
+    bullets = results["bullets"]
+    flashcards = results["flashcards"]
+    mindmap = results["mindmap"]
     
-    # ---- ENHANCED MINDMAP FROM FORMATTED TEXT ---- using new function  
-    mindmap = generate_mindmap_from_formatted_text(markdown_text, title)
+    if incremental:
+        owners = {name: results[name + "_owners"] for name in ("bullets", "flashcards", "mindmap")}
+    else:
+        owners = {
+            "bullets": attribute_items(bullets, sections),
+            "flashcards": attribute_items([flashcard_text(card) for card in flashcards], sections),
+            "mindmap": attribute_items([branch_text(branch) for branch in mindmap.get("branches", [])], sections),
+        }
     
     # ---- GENERATE ENHANCED MARKDOWN CONTENT ----
     markdown_content = generate_study_materials_markdown(title, markdown_text, bullets, flashcards, mindmap)
     
-    return jsonify({
+    document_id = save_document(document_id, {
+        "text": corrected_text,
+        "title": title,
+        "formatted_text": markdown_text,
         "bullets": bullets,
         "flashcards": flashcards,
         "mindmap": mindmap,
-        "markdown_content": markdown_content,
-        "formatted_text": markdown_text
+        "sections": {"markdown": results["section_markdown"], **owners}
     })
+    if QUIZ_BANK_SIZE > 0:
+        question_bank.fill_async(document_id, corrected_text, question_bank_key(corrected_text))
+    
+    return {
+        "bullets": bullets,
+        "flashcards": flashcards,
+        "mindmap": mindmap,
+        "markdown_content": markdown_content,
+        "formatted_text": markdown_text,
+        "document_id": document_id,
+        "sections": {
+            "total": len(sections),
+            "changed": len(changed),
+            "mode": "incremental" if incremental else "full"
+        }
+    }
+
+def full_study_stages(corrected_text, title, mode):
+    """Stages generating bullets, flashcards and mindmap for the whole document"""
+    stages = []
+    if mode == "combined":
+        # One Gemini call for all three artifacts; the per-artifact stages
+        # below only call Gemini again for sections that failed validation
+        stages.append(Stage("combined",
+                            lambda deps: generate_study_materials_combined(deps["markdown"], title),
+                            deps=["markdown"],
+                            timeout=STAGE_TIMEOUT_SECONDS,
+                            fallback=lambda deps: {}))
+        bullet_deps = flashcard_deps = mindmap_deps = ["markdown", "combined"]
+    else:
+        # Key points only need the raw text; flashcards and mindmap only need the
+        # markdown, so the critical path is markdown -> (flashcards | mindmap)
+        bullet_deps = []
+        flashcard_deps = mindmap_deps = ["markdown"]
+    
+    stages.extend([
+        # ---- ENHANCED BULLETS ---- using existing function
+        Stage("bullets",
+              lambda deps: deps.get("combined", {}).get("bullets") or extract_enhanced_key_points(corrected_text),
+              deps=bullet_deps,
+              timeout=STAGE_TIMEOUT_SECONDS,
+              fallback=lambda deps: fallback_key_points(corrected_text)),
+        # ---- ENHANCED FLASHCARDS FROM FORMATTED TEXT ---- using new function
+        Stage("flashcards",
+              lambda deps: deps.get("combined", {}).get("flashcards") or generate_flashcards_from_formatted_text(deps["markdown"]),
+              deps=flashcard_deps,
+              timeout=STAGE_TIMEOUT_SECONDS,
+              fallback=lambda deps: generate_fallback_flashcards_from_formatted(deps["markdown"])),
+        # ---- ENHANCED MINDMAP FROM FORMATTED TEXT ---- using new function
+        Stage("mindmap",
+              lambda deps: deps.get("combined", {}).get("mindmap") or generate_mindmap_from_formatted_text(deps["markdown"], title),
+              deps=mindmap_deps,
+              timeout=STAGE_TIMEOUT_SECONDS,
+              fallback=lambda deps: generate_fallback_mindmap_from_formatted(deps["markdown"], title)),
+    ])
+    return stages
+
+def incremental_study_stages(sections, changed, previous, title):
+    """Stages that keep study items from unchanged sections and regenerate only the changed ones.
+    
+    Each artifact stage is followed by an "<name>_owners" stage holding the
+    section hash every item is attributed to.
+    """
+    owners = previous["sections"]
+    changed_text = "\n\n".join(section.text for section in changed)
+    
+    def changed_markdown(deps):
+        return "\n\n".join(deps["section_markdown"][section.hash] for section in changed)
+    
+    def merged(name, previous_items, new_items, describe, limit):
+        items, item_owners = merge_items(
+            previous_items, owners.get(name, []),
+            new_items, attribute_items([describe(item) for item in new_items], changed),
+            sections, limit, len(changed)
+        )
+        return {"items": items, "owners": item_owners}
+    
+    def bullets(deps, generate):
+        new_items = generate(changed_text) if changed else []
+        return merged("bullets", previous["bullets"], new_items, lambda bullet: bullet, 8)
+    
+    def flashcards(deps, generate):
+        new_items = generate(changed_markdown(deps)) if changed else []
+        return merged("flashcards", previous["flashcards"], new_items, flashcard_text, 8)
+    
+    def mindmap(deps, generate):
+        new_items = generate(changed_markdown(deps), title).get("branches", []) if changed else []
+        return merged("mindmap", previous["mindmap"].get("branches", []), new_items, branch_text, 12)
+    
+    stages = [
+        Stage("bullets_merged",
+              lambda deps: bullets(deps, extract_enhanced_key_points),
+              timeout=STAGE_TIMEOUT_SECONDS,
+              fallback=lambda deps: bullets(deps, fallback_key_points)),
+        Stage("flashcards_merged",
+              lambda deps: flashcards(deps, generate_flashcards_from_formatted_text),
+              deps=["section_markdown"],
+              timeout=STAGE_TIMEOUT_SECONDS,
+              fallback=lambda deps: flashcards(deps, generate_fallback_flashcards_from_formatted)),
+        Stage("mindmap_merged",
+              lambda deps: mindmap(deps, generate_mindmap_from_formatted_text),
+              deps=["section_markdown"],
+              timeout=STAGE_TIMEOUT_SECONDS,
+              fallback=lambda deps: mindmap(deps, generate_fallback_mindmap_from_formatted)),
+        Stage("mindmap",
+              lambda deps: {**previous["mindmap"], "central_topic": title, "branches": deps["mindmap_merged"]["items"]},
+              deps=["mindmap_merged"]),
+    ]
+    for name in ("bullets", "flashcards"):
+        stages.append(Stage(name, lambda deps, name=name: deps[name + "_merged"]["items"], deps=[name + "_merged"]))
+    for name in ("bullets", "flashcards", "mindmap"):
+        stages.append(Stage(name + "_owners", lambda deps, name=name: deps[name + "_merged"]["owners"], deps=[name + "_merged"]))
+    return stages
+
+def load_previous_sections(document_id):
+    """Stored study materials with section attribution, or None if the document was never processed"""
+    if not (INCREMENTAL_PROCESSING and document_id):
+        return None
+    previous = document_store.get(document_id, ["sections", "bullets", "flashcards", "mindmap"])
+    if not previous or not all(previous.get(name) is not None for name in ("sections", "bullets", "flashcards", "mindmap")):
+        return None
+    return previous
+
+def convert_sections_to_markdown(sections, previous_markdown=None):
+    """Markdown for each section keyed by section hash; only sections without previous markdown are converted"""
+    previous_markdown = previous_markdown or {}
+    markdown = {section.hash: previous_markdown[section.hash] for section in sections if section.hash in previous_markdown}
+    pending = [section for section in sections if section.hash not in markdown]
+    if len(pending) == 1:
+        markdown[pending[0].hash] = convert_text_to_markdown(pending[0].text)
+    elif pending:
+        with ThreadPoolExecutor(max_workers=min(len(pending), SECTION_MARKDOWN_WORKERS)) as executor:
+            for section, section_markdown in zip(pending, executor.map(lambda s: convert_text_to_markdown(s.text), pending)):
+                markdown[section.hash] = section_markdown
+    return markdown
+
+def flashcard_text(card):
+    """Text used to attribute a flashcard to a section"""
+    if not isinstance(card, dict):
+        return str(card)
+    return f"{card.get('question', '')} {card.get('answer', '')}"
+
+def branch_text(branch):
+    """Text used to attribute a mindmap branch to a section"""
+    sub_branches = branch.get("sub_branches", []) if isinstance(branch, dict) else []
+    return " ".join([str(branch.get("name", "")) if isinstance(branch, dict) else str(branch)] + [str(sub) for sub in sub_branches])
+
+def save_document(document_id, fields):
+    """Update a stored document, or create one if the ID is missing or expired"""
+    if document_id and document_store.exists(document_id):
+        document_store.update(document_id, fields)
+        return document_id
+    return document_store.create(fields)
+
+def resolve_context(data):
+    """Return the study text for a request: a stored "document_id" or inline "context".
+    
+    An unknown or expired document_id falls back to the inline context, if
+    the request has one (the frontend sends both after the store may have
+    evicted a document); the id is then dropped from data so the request
+    is handled as inline-only. Returns (context, None) on success or
+    (None, error_response) otherwise.
+    """
+    document_id = data.get("document_id")
+    if document_id:
+        context = document_store.get_field(document_id, "text")
+        if context is not None:
+            return context, None
+        if "context" not in data:
+            return None, (jsonify({"error": "Document not found or expired"}), 404)
+        data.pop("document_id")
+    
+    if "context" not in data:
+        return None, (jsonify({"error": "Context or document_id is required"}), 400)
+    return data["context"], None
+
+@tracer.traced("gemini.markdown")
 def convert_text_to_markdown(text):
-    """Enhanced text to markdown conversion using AI"""
+    """Enhanced text to markdown conversion using AI.
+    
+    Long text is converted in overlapping windows in parallel; a window
+    whose call fails gets the basic conversion instead.
+    """
     if not text:
         return ""
     
-    model = genai.GenerativeModel("gemini-1.5-pro")  # Using stable model
+    if is_oversized(text):
+        return clean_markdown_formatting(run_chunked("markdown", text, request_markdown_conversion, basic_text_to_markdown))
+    
+    try:
+        return request_markdown_conversion(text) or clean_markdown_formatting(text)
+    except Exception as e:
+        # Fallback to basic markdown conversion
+        return basic_text_to_markdown(text)
+
+def request_markdown_conversion(text):
+    """Gemini's markdown version of the text (cached), or an empty string if it returned nothing"""
+    cache_key = make_key("markdown", text, model=GEMINI_MODEL, prompt_version=PROMPT_VERSION)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    material = prompt_builder.prepare("markdown", text)
+    
     prompt = f"""Convert this study note text into clean, well-structured markdown format. Follow these rules:
 
 1. Use appropriate heading levels (##, ###, ####)
@@ -175,50 +854,28 @@ def convert_text_to_markdown(text):
 
 Text to convert:
 ---
-{text}
+{material.text}
 ---
 
 Return ONLY the markdown-formatted text, no explanations."""
     
-    try:
-        response = model.generate_content(prompt)
-        markdown_text = response.text if response and response.text else text
-        return clean_markdown_formatting(markdown_text)
-    except Exception as e:
-        # Fallback to basic markdown conversion
-        return basic_text_to_markdown(text)
-
-def basic_text_to_markdown(text):
-    """Fallback basic markdown conversion"""
-    lines = text.split('\n')
-    markdown_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            markdown_lines.append('')
-            continue
-            
-        # Detect and format different types of content
-        if is_heading(line):
-            markdown_lines.append(format_as_heading(line))
-        elif is_bullet_point(line):
-            markdown_lines.append(format_as_bullet(line))
-        elif is_numbered_item(line):
-            markdown_lines.append(format_as_numbered_item(line))
-        elif is_definition(line):
-            markdown_lines.append(format_as_definition(line))
-        elif is_formula_or_equation(line):
-            markdown_lines.append(format_as_code_block(line))
-        else:
-            # Regular paragraph
-            markdown_lines.append(line)
-    
-    return clean_markdown_formatting('\n'.join(markdown_lines))
+    response_text = generate_prompt(material, prompt)
+    if not response_text:
+        return ""
+    markdown_text = clean_markdown_formatting(response_text)
+    result_cache.set(cache_key, markdown_text)
+    return markdown_text
 
+@tracer.traced("gemini.key_points")
 def extract_enhanced_key_points(text):
     """Extract key points using enhanced AI prompt"""
-    model = genai.GenerativeModel("gemini-1.5-pro")  # Using stable model
+    cache_key = make_key("key_points", text, model=GEMINI_MODEL, prompt_version=PROMPT_VERSION)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    material = prompt_builder.prepare("key_points", text)
+    
     prompt = f"""Analyze the following study material and extract 5-8 key points that capture the most important concepts, facts, or insights.
 
 Guidelines:
@@ -230,25 +887,38 @@ Guidelines:
 
 Study Material:
 ---
-{text}
+{material.text}
 ---
 
 Return ONLY a JSON array of strings, each representing a key point:
 ["Key point 1", "Key point 2", ...]"""
     
     try:
-        response = model.generate_content(prompt)
-        key_points = json.loads(response.text)
+        response_text = generate_prompt(material, prompt)
+        key_points = llm_json.extract("key_points", response_text, item_valid=is_valid_key_point)
         # Format as bullet points
-        return [f"• {point}" for point in key_points[:8]]  # Limit to 8 points
+        bullets = [f"• {point}" for point in key_points[:8]]  # Limit to 8 points
+        result_cache.set(cache_key, bullets)
+        return bullets
     except Exception:
-        # Fallback extraction
-        lines = [line.strip() for line in text.split('\n') if line.strip() and len(line.split()) >= 3]
-        return [f"• {line}" for line in lines[:6]]
+        llm_json.record_fallback("key_points")
+        return fallback_key_points(text)
+
+def fallback_key_points(text):
+    """Fallback extraction of key points from the first substantial lines"""
+    lines = [line.strip() for line in text.split('\n') if line.strip() and len(line.split()) >= 3]
+    return [f"• {line}" for line in lines[:6]]
 
+@tracer.traced("gemini.flashcards")
 def generate_enhanced_flashcards(text):
     """Generate flashcards with enhanced AI prompt"""
-    model = genai.GenerativeModel("gemini-1.5-pro")
+    cache_key = make_key("flashcards_raw", text, model=GEMINI_MODEL, prompt_version=PROMPT_VERSION)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    material = prompt_builder.prepare("flashcards", text)
+    
     prompt = f"""Create 5-8 high-quality flashcards based EXCLUSIVELY on the provided study material. Each flashcard must test specific information, concepts, or details found in the text.
 
 FLASHCARD CREATION RULES:
@@ -278,7 +948,7 @@ QUESTION QUALITY:
 
 Study Material:
 ---
-{text}
+{material.text}
 ---
 
 Return ONLY a JSON array with this exact format:
@@ -296,20 +966,29 @@ Return ONLY a JSON array with this exact format:
 CRITICAL: Every question and answer must be based on information explicitly stated in the study material above. Do not add external knowledge or make assumptions."""
     
     try:
-        response = model.generate_content(prompt)
-        flashcards = json.loads(response.text)
-        return flashcards[:6]  # Limit to 6 cards
+        response_text = generate_prompt(material, prompt)
+        flashcards = llm_json.extract("flashcards", response_text, item_valid=is_valid_flashcard)[:6]  # Limit to 6 cards
+        result_cache.set(cache_key, flashcards)
+        return flashcards
     except Exception:
         # Fallback flashcards
+        llm_json.record_fallback("flashcards")
         lines = [line.strip() for line in text.split('\n') if line.strip()]
         return [
             {"question": "What is the main topic of these notes?", "answer": lines[0] if lines else "Study material"},
             {"question": "What are the key concepts mentioned?", "answer": ". ".join(lines[:3]) if len(lines) >= 3 else "Key study concepts"}
         ]
 
+@tracer.traced("gemini.mindmap")
 def generate_enhanced_mindmap(text, title):
     """Generate mindmap with enhanced AI prompt"""
-    model = genai.GenerativeModel("gemini-1.5-pro")
+    cache_key = make_key("mindmap_raw", text, model=GEMINI_MODEL, prompt_version=PROMPT_VERSION, title=title)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    material = prompt_builder.prepare("mindmap", text)
+    
     prompt = f"""Analyze the study material and create a comprehensive hierarchical mind map that captures ALL key information from the content.
 
 ANALYSIS INSTRUCTIONS:
@@ -330,7 +1009,7 @@ CONTENT REQUIREMENTS:
 
 Study Material to Analyze:
 ---
-{text}
+{material.text}
 ---
 
 Return ONLY a JSON object with this exact format:
@@ -360,11 +1039,13 @@ Return ONLY a JSON object with this exact format:
 IMPORTANT: Extract information DIRECTLY from the provided study material. Do not add external knowledge."""
     
     try:
-        response = model.generate_content(prompt)
-        mindmap = json.loads(response.text)
+        response_text = generate_prompt(material, prompt)
+        mindmap = llm_json.extract("mindmap", response_text, expect=dict, repair=drop_invalid_branches, valid=is_valid_mindmap)
+        result_cache.set(cache_key, mindmap)
         return mindmap
     except Exception:
         # Fallback mindmap
+        llm_json.record_fallback("mindmap")
         lines = [line.strip() for line in text.split('\n') if line.strip()]
         return {
             "central_topic": title,
@@ -376,113 +1057,7 @@ IMPORTANT: Extract information DIRECTLY from the provided study material. Do not
             ]
         }
 
-def clean_markdown_formatting(text):
-    """Clean and improve markdown formatting"""
-    # Remove excessive blank lines
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
-    
-    # Ensure proper spacing around headings
-    text = re.sub(r'\n(#{1,6}\s+[^\n]+)\n', r'\n\n\1\n\n', text)
-    
-    # Fix bullet point spacing
-    text = re.sub(r'\n(-\s+[^\n]+)\n(-\s+)', r'\n\1\n\2', text)
-    
-    # Remove trailing spaces
-    text = re.sub(r' +\n', '\n', text)
-    
-    return text.strip()
-
-# Helper functions for basic markdown conversion
-def is_heading(line):
-    """Detect if a line should be formatted as a heading"""
-    heading_indicators = [
-        'chapter', 'section', 'part', 'unit', 'lesson',
-        'introduction', 'conclusion', 'summary', 'overview',
-        'definition', 'theorem', 'principle', 'concept'
-    ]
-    
-    line_lower = line.lower()
-    
-    # Short lines that might be titles
-    if len(line.split()) <= 5 and any(indicator in line_lower for indicator in heading_indicators):
-        return True
-    
-    # Lines that are all caps (likely headings)
-    if line.isupper() and len(line.split()) <= 6:
-        return True
-    
-    # Lines ending with colons (might be section headers)
-    if line.endswith(':') and len(line.split()) <= 6:
-        return True
-    
-    return False
-
-def format_as_heading(line):
-    """Format line as markdown heading"""
-    line = line.rstrip(':')  # Remove trailing colon if present
-    
-    # Determine heading level based on content
-    if any(word in line.lower() for word in ['chapter', 'unit', 'part']):
-        return f"## {line}"
-    else:
-        return f"### {line}"
-
-def is_bullet_point(line):
-    """Detect if line is a bullet point"""
-    bullet_markers = ['•', '◦', '▪', '▫', '‣', '-', '*']
-    return any(line.startswith(marker) for marker in bullet_markers)
-
-def format_as_bullet(line):
-    """Format as proper markdown bullet"""
-    for marker in ['•', '◦', '▪', '▫', '‣', '-', '*']:
-        if line.startswith(marker):
-            line = line[1:].strip()
-            break
-    return f"- {line}"
-
-def is_numbered_item(line):
-    """Detect numbered list items"""
-    return bool(re.match(r'^\d+\.?\s+', line))
-
-def format_as_numbered_item(line):
-    """Format numbered items properly"""
-    match = re.match(r'^(\d+)\.?\s+(.*)', line)
-    if match:
-        number, content = match.groups()
-        return f"{number}. {content}"
-    return line
-
-def is_definition(line):
-    """Detect definition patterns"""
-    definition_patterns = [
-        ' is ', ' are ', ' means ', ' refers to ', ' defined as ',
-        ':', ' = ', ' equals ', ' represents '
-    ]
-    return any(pattern in line.lower() for pattern in definition_patterns)
-
-def format_as_definition(line):
-    """Format definitions with emphasis"""
-    separators = [' is ', ' are ', ' means ', ' refers to ', ' defined as ', ': ']
-    
-    for sep in separators:
-        if sep in line.lower():
-            parts = line.split(sep, 1)
-            if len(parts) == 2:
-                term = parts[0].strip()
-                definition = parts[1].strip()
-                return f"**{term}**{sep}{definition}"
-    
-    return line
-
-def is_formula_or_equation(line):
-    """Detect mathematical formulas or equations"""
-    math_indicators = ['=', '+', '-', '×', '÷', '∑', '∫', '√', '^', '²', '³']
-    return any(indicator in line for indicator in math_indicators) and len([c for c in line if c.isalpha()]) < len([c for c in line if c.isdigit() or c in math_indicators])
-
-def format_as_code_block(line):
-    """Format as inline code or code block"""
-    return f"`{line}`"
-
+@tracer.traced("study_materials.markdown")
 def generate_study_materials_markdown(title, original_text, bullets, flashcards, mindmap):
     """Generate enhanced, well-formatted markdown content for study materials"""
     from datetime import datetime
@@ -669,17 +1244,41 @@ def generate_mindmap_markdown_display(mindmap):
 def generate_quiz():
     data = request.get_json()
     
-    if not data or "context" not in data:
+    if not data:
         return jsonify({"error": "Context is required"}), 400
     
-    context = data["context"]
+    context, error_response = resolve_context(data)
+    if error_response:
+        return error_response
+    
     quiz_type = data.get("quiz_type", "mixed")
     num_questions = data.get("num_questions", 5)
     
     if not context.strip():
         return jsonify({"error": "No study material available. Please upload and process a file first."}), 400
     
-    model = genai.GenerativeModel("gemini-1.5-pro")  # Using stable model
+    document_id = data.get("document_id")
+    try:
+        if document_id and QUIZ_BANK_SIZE > 0:
+            questions = question_bank.get_quiz(document_id, context, question_bank_key(context), quiz_type, num_questions)
+        else:
+            questions = generate_quiz_questions(context, quiz_type, num_questions)
+        return jsonify({"questions": questions})
+    except Exception as e:
+        # Enhanced fallback questions
+        llm_json.record_fallback("quiz")
+        fallback_questions = generate_fallback_quiz(context, quiz_type, num_questions)
+        return jsonify({"questions": fallback_questions})
+
+def question_bank_key(text):
+    """Identifies the study text (and prompt version) a document's question bank was built from"""
+    return make_key("question_bank", text, model=GEMINI_MODEL, prompt_version=PROMPT_VERSION)
+
+@tracer.traced("gemini.quiz")
+def generate_quiz_questions(context, quiz_type, num_questions):
+    """Ask Gemini for quiz questions on the context; returns the ones with a valid format"""
+    quiz_context = select_coverage_context(context, QUIZ_CONTEXT_WORDS)
+    material = prompt_builder.prepare("quiz", quiz_context)
     
     enhanced_quiz_prompt = f"""Create {num_questions} high-quality {quiz_type} questions based EXCLUSIVELY on the provided study material. Every question must test specific information found in the text.
 
@@ -703,7 +1302,7 @@ AVOID:
 
 Study Material:
 ---
-{context}
+{material.text}
 ---
 
 IMPORTANT: Base every question on specific information, concepts, facts, or relationships explicitly mentioned in the study material above.
@@ -712,21 +1311,13 @@ IMPORTANT: Base every question on specific information, concepts, facts, or rela
 
 Return ONLY a valid JSON array, no other text."""
     
-    try:
-        response = model.generate_content(enhanced_quiz_prompt)
-        questions = json.loads(response.text)
-        
-        # Validate and limit questions
-        cleaned_questions = []
-        for q in questions[:num_questions]:
-            if validate_question_format(q, quiz_type):
-                cleaned_questions.append(q)
-        
-        return jsonify({"questions": cleaned_questions})
-    except Exception as e:
-        # Enhanced fallback questions
-        fallback_questions = generate_fallback_quiz(context, quiz_type, num_questions)
-        return jsonify({"questions": fallback_questions})
+    response_text = generate_prompt(material, enhanced_quiz_prompt)
+    # Questions with an invalid format are dropped before limiting
+    questions = llm_json.extract(
+        "quiz", response_text,
+        item_valid=lambda q: isinstance(q, dict) and validate_question_format(q, quiz_type),
+    )
+    return questions[:num_questions]
 
 def get_quiz_format_instructions(quiz_type):
     """Get specific format instructions for different quiz types"""
@@ -883,18 +1474,32 @@ def check_answer():
 def ai_tutor_chat():
     data = request.get_json()
     
-    if not data or "question" not in data or "context" not in data:
+    if not data or "question" not in data:
         return jsonify({"error": "Question and context are required"}), 400
     
     question = data["question"]
-    context = data["context"]
+    context, error_response = resolve_context(data)
+    if error_response:
+        return error_response
     
     if not context.strip():
         return jsonify({"error": "No study material available. Please upload and process an image first."}), 400
     
-    model = genai.GenerativeModel("gemini-1.5-pro")  # Using stable model
+    material, enhanced_tutor_prompt = build_tutor_prompt(question, select_relevant_context(context, question, CHAT_CONTEXT_WORDS))
     
-    enhanced_tutor_prompt = f"""You are an expert AI tutor. Your role is to help the student understand their study material by answering questions clearly and educationally.
+    try:
+        response_text = generate_prompt(material, enhanced_tutor_prompt)
+        answer = response_text if response_text else "I'm sorry, I couldn't generate a response. Please try again."
+        
+        return jsonify({"answer": answer.strip()})
+    except Exception as e:
+        return jsonify({"error": f"Failed to get tutor response: {str(e)}"}), 500
+
+
+def build_tutor_prompt(question, context):
+    """Build the AI tutor prompt for a student question; returns (material, prompt)"""
+    material = prompt_builder.prepare("tutor", context, query=question)
+    return material, f"""You are an expert AI tutor. Your role is to help the student understand their study material by answering questions clearly and educationally.
 
 Guidelines:
 - Use ONLY the provided study material to answer
@@ -906,25 +1511,62 @@ Guidelines:
 
 Study Material:
 ---
-{context}
+{material.text}
 ---
 
 Student's Question: {question}
 
 Provide a helpful, educational response based solely on the study material."""
+
+@app.route("/api/chat/stream", methods=["POST"])
+def ai_tutor_chat_stream():
+    """Stream the tutor answer as Server-Sent Events while Gemini generates it"""
+    data = request.get_json()
     
-    try:
-        response = model.generate_content(enhanced_tutor_prompt)
-        answer = response.text if response and response.text else "I'm sorry, I couldn't generate a response. Please try again."
-        
-        return jsonify({"answer": answer.strip()})
-    except Exception as e:
-        return jsonify({"error": f"Failed to get tutor response: {str(e)}"}), 500
+    if not data or "question" not in data:
+        return jsonify({"error": "Question and context are required"}), 400
+    
+    question = data["question"]
+    context, error_response = resolve_context(data)
+    if error_response:
+        return error_response
+    
+    if not context.strip():
+        return jsonify({"error": "No study material available. Please upload and process an image first."}), 400
+    
+    material, enhanced_tutor_prompt = build_tutor_prompt(question, select_relevant_context(context, question, CHAT_CONTEXT_WORDS))
+    
+    def generate():
+        try:
+            for chunk in llm.stream(enhanced_tutor_prompt):
+                yield format_sse({"delta": chunk})
+            prompt_builder.record(material, enhanced_tutor_prompt, llm.last_usage())
+            yield format_sse({}, event="done")
+        except Exception as e:
+            yield format_sse({"error": f"Failed to get tutor response: {str(e)}"}, event="error")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
+def format_sse(payload, event=None):
+    """Encode a payload as a Server-Sent Events frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(payload)}\n\n"
 
+
+@tracer.traced("gemini.flashcards_formatted")
 def generate_flashcards_from_formatted_text(formatted_text):
     """Generate flashcards from formatted markdown text using structure and content"""
-    model = genai.GenerativeModel("gemini-1.5-pro")
+    cache_key = make_key("flashcards", formatted_text, model=GEMINI_MODEL, prompt_version=PROMPT_VERSION)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    material = prompt_builder.prepare("flashcards_formatted", formatted_text)
+    
     prompt = f"""You are given formatted markdown text from study notes. Create 6-8 high-quality flashcards based on the content, structure, and information presented in this formatted text.
 
 FLASHCARD CREATION RULES:
@@ -954,7 +1596,7 @@ QUESTION QUALITY:
 
 Formatted Text:
 ---
-{formatted_text}
+{material.text}
 ---
 
 Return ONLY a JSON array with this exact format:
@@ -972,16 +1614,25 @@ Return ONLY a JSON array with this exact format:
 CRITICAL: Base every flashcard on information explicitly found in the formatted text above. Use the heading structure to organize and categorize your questions."""
     
     try:
-        response = model.generate_content(prompt)
-        flashcards = json.loads(response.text)
-        return flashcards[:8]  # Limit to 8 cards
+        response_text = generate_prompt(material, prompt)
+        flashcards = llm_json.extract("flashcards_formatted", response_text, item_valid=is_valid_flashcard)[:8]  # Limit to 8 cards
+        result_cache.set(cache_key, flashcards)
+        return flashcards
     except Exception:
         # Fallback flashcards based on formatted text structure
+        llm_json.record_fallback("flashcards_formatted")
         return generate_fallback_flashcards_from_formatted(formatted_text)
 
+@tracer.traced("gemini.mindmap_formatted")
 def generate_mindmap_from_formatted_text(formatted_text, title):
     """Generate mindmap from formatted text using headings as main structure"""
-    model = genai.GenerativeModel("gemini-1.5-pro")
+    cache_key = make_key("mindmap", formatted_text, model=GEMINI_MODEL, prompt_version=PROMPT_VERSION, title=title)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    material = prompt_builder.prepare("mindmap_formatted", formatted_text)
+    
     prompt = f"""You are given formatted markdown text with headings and structured content. Create a comprehensive hierarchical mind map that uses the HEADINGS as the main organizational structure.
 
 MINDMAP CREATION INSTRUCTIONS:
@@ -1007,7 +1658,7 @@ CONTENT EXTRACTION:
 
 Formatted Text to Analyze:
 ---
-{formatted_text}
+{material.text}
 ---
 
 Return ONLY a JSON object with this exact format:
@@ -1041,11 +1692,13 @@ IMPORTANT:
 - Include important details, not just heading titles"""
     
     try:
-        response = model.generate_content(prompt)
-        mindmap = json.loads(response.text)
+        response_text = generate_prompt(material, prompt)
+        mindmap = llm_json.extract("mindmap_formatted", response_text, expect=dict, repair=drop_invalid_branches, valid=is_valid_mindmap)
+        result_cache.set(cache_key, mindmap)
         return mindmap
     except Exception:
         # Fallback mindmap based on formatted text structure
+        llm_json.record_fallback("mindmap_formatted")
         return generate_fallback_mindmap_from_formatted(formatted_text, title)
 
 def generate_fallback_flashcards_from_formatted(formatted_text):
@@ -1152,6 +1805,109 @@ def generate_fallback_mindmap_from_formatted(formatted_text, title):
         "branches": branches[:6]  # Limit to 6 main branches
     }
 
+@tracer.traced("gemini.study_materials_combined")
+def generate_study_materials_combined(formatted_text, title):
+    """Generate key points, flashcards and mindmap with a single Gemini call.
+    
+    Returns a dict holding only the sections that passed validation, so the
+    caller can regenerate the missing ones individually.
+    """
+    cache_key = make_key("study_materials", formatted_text, model=GEMINI_MODEL, prompt_version=PROMPT_VERSION, title=title)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    material = prompt_builder.prepare("study_materials", formatted_text)
+    
+    prompt = f"""You are given formatted markdown text from study notes. Create three study artifacts from it.
+
+1. BULLETS: 5-8 key points capturing the most important concepts, facts, definitions or formulas. Each point is 1-2 sentences and likely exam material.
+2. FLASHCARDS: 6-8 flashcards testing definitions, facts, processes, relationships, applications and comparisons. Cover different headings/sections and use the same terminology as the text.
+3. MINDMAP: A hierarchical mind map whose main branches are the major headings (##, ###) and whose sub-branches are 3-6 key points, definitions, examples or formulas from under each heading.
+
+Formatted Text:
+---
+{material.text}
+---
+
+Return ONLY a JSON object with this exact format:
+{{
+  "bullets": ["Key point 1", "Key point 2"],
+  "flashcards": [
+    {{"question": "Specific question from the text", "answer": "Answer found in the text"}}
+  ],
+  "mindmap": {{
+    "central_topic": "{title}",
+    "branches": [
+      {{"name": "Main heading from the text", "sub_branches": ["Key point from under this heading"]}}
+    ]
+  }}
+}}
+
+CRITICAL: Base everything on information explicitly found in the formatted text above. Do not add external knowledge."""
+    
+    try:
+        response_text = generate_prompt(material, prompt, generation_config={"response_mime_type": "application/json"})
+        data = llm_json.extract("study_materials", response_text, expect=dict)
+    except Exception:
+        llm_json.record_fallback("study_materials")
+        return {}
+    
+    # Invalid bullets/flashcards are dropped rather than discarding the whole list
+    sections = {}
+    bullets = data.get("bullets")
+    bullets = [point for point in bullets if is_valid_key_point(point)] if isinstance(bullets, list) else []
+    if bullets:
+        sections["bullets"] = [f"• {point}" for point in bullets[:8]]
+    flashcards = data.get("flashcards")
+    flashcards = [card for card in flashcards if is_valid_flashcard(card)] if isinstance(flashcards, list) else []
+    if flashcards:
+        sections["flashcards"] = flashcards[:8]
+    mindmap = drop_invalid_branches(data.get("mindmap"))
+    if is_valid_mindmap(mindmap):
+        sections["mindmap"] = mindmap
+    
+    # Partial results are still returned but only complete ones are cached
+    if len(sections) == 3:
+        result_cache.set(cache_key, sections)
+    else:
+        llm_json.record_fallback("study_materials")
+    return sections
+
+def is_valid_key_point(point):
+    """Check a key point is a non-empty string"""
+    return isinstance(point, str) and bool(point.strip())
+
+def is_valid_flashcard(card):
+    """Check a flashcard is a question/answer object"""
+    return (
+        isinstance(card, dict)
+        and isinstance(card.get("question"), str) and bool(card["question"].strip())
+        and isinstance(card.get("answer"), str) and bool(card["answer"].strip())
+    )
+
+def is_valid_branch(branch):
+    """Check a mindmap branch has a name and a list of string sub-branches"""
+    return (
+        isinstance(branch, dict)
+        and isinstance(branch.get("name"), str)
+        and isinstance(branch.get("sub_branches"), list)
+        and all(isinstance(item, str) for item in branch["sub_branches"])
+    )
+
+def is_valid_mindmap(mindmap):
+    """Check a mindmap has a central topic and well-formed branches"""
+    if not isinstance(mindmap, dict) or not isinstance(mindmap.get("central_topic"), str):
+        return False
+    branches = mindmap.get("branches")
+    return isinstance(branches, list) and bool(branches) and all(is_valid_branch(branch) for branch in branches)
+
+def drop_invalid_branches(mindmap):
+    """A parsed mindmap without its malformed branches"""
+    if isinstance(mindmap, dict) and isinstance(mindmap.get("branches"), list):
+        return dict(mindmap, branches=[branch for branch in mindmap["branches"] if is_valid_branch(branch)])
+    return mindmap
+
 
 # ------------------ Notes Processing (existing functionality) ------------------
 @app.route("/api/process-notes", methods=["POST"])
@@ -1175,11 +1931,159 @@ def process_notes():
     flashcards = generate_enhanced_flashcards(text_content)
     mindmap = generate_enhanced_mindmap(text_content, title)
     
-    return jsonify({
+    document_id = document_store.create({
+        "text": text_content,
+        "title": title,
         "bullets": bullets,
         "flashcards": flashcards,
         "mindmap": mindmap
     })
+    
+    return jsonify({
+        "bullets": bullets,
+        "flashcards": flashcards,
+        "mindmap": mindmap,
+        "document_id": document_id
+    })
+
+# ------------------ Background Jobs ------------------
+@app.route("/api/jobs/ocr", methods=["POST"])
+def submit_ocr_job():
+    if "file" not in request.files:
+        return jsonify({"error": "No file uploaded"}), 400
+    
+    file = request.files["file"]
+    upload_path = spool_upload(file)
+    # The spooled file outlives this request and is removed when the job finishes
+    return submit_job("ocr", run_ocr_pipeline, upload_path, file.filename.lower(),
+                      on_finish=lambda job: remove_upload(upload_path))
+
+@app.route("/api/jobs/process-corrected-text", methods=["POST"])
+def submit_processing_job():
+    data = request.get_json()
+    
+    if not data or "text" not in data:
+        return jsonify({"error": "No text provided"}), 400
+    
+    return submit_job(
+        "process-corrected-text",
+        run_study_materials_pipeline,
+        data["text"],
+        data.get("title", "Study Notes"),
+        mode=data.get("mode", STUDY_MATERIALS_MODE),
+        document_id=data.get("document_id")
+    )
+
+def submit_job(kind, pipeline, *args, on_finish=None, **kwargs):
+    """Queue a pipeline run and answer 202 with the job ID"""
+    try:
+        job = job_manager.submit(kind, lambda job, *a, **kw: pipeline(*a, job=job, **kw), *args,
+                                 on_finish=on_finish, **kwargs)
+    except QueueFull as e:
+        if on_finish:
+            on_finish(None)
+        return jsonify({"error": str(e)}), 503
+    return jsonify(job.to_dict()), 202
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/api/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(job.to_dict(include_result=False))
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Stream job progress as Server-Sent Events until the job finishes"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    
+    def generate():
+        version = -1
+        while True:
+            new_version = job.wait_for_update(version, timeout=15)
+            if new_version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            if job.finished:
+                yield format_sse(job.to_dict(), event=job.status)
+                return
+            yield format_sse(job.to_dict(include_result=False), event="progress")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ------------------ Stored Documents ------------------
+@app.route("/api/documents/<document_id>", methods=["GET"])
+def get_document(document_id):
+    document = document_store.get(document_id)
+    if document is None:
+        return jsonify({"error": "Document not found or expired"}), 404
+    
+    # Section bookkeeping for incremental reprocessing and the quiz question
+    # bank (which holds the answers) are internal
+    document.pop("sections", None)
+    document.pop(question_bank.field, None)
+    document["document_id"] = document_id
+    return jsonify(document)
+
+# ------------------ Tracing & Metrics ------------------
+@app.before_request
+def start_request_trace():
+    g.request_started = time.perf_counter()
+    tracer.start_trace()
+
+@app.after_request
+def finish_request_trace(response):
+    trace = tracer.end_trace()
+    started = g.pop("request_started", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        tracer.observe_request(request.method, request.endpoint, response.status_code, elapsed)
+        if SERVER_TIMING and tracer.enabled:
+            trace["total"] = [elapsed, 1]
+            response.headers["Server-Timing"] = tracer.server_timing(trace)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(tracer.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+# ------------------ Health ------------------
+@app.route("/api/health", methods=["GET"])
+def health():
+    """Report client status; ?check=1 also builds the clients and runs their health checks"""
+    check = request.args.get("check") == "1"
+    report = clients.health(check=check)
+    healthy = all(status.get("healthy", True) for status in report.values())
+    return jsonify({"status": "ok" if healthy else "degraded", "clients": report}), 200 if healthy else 503
+
+# ------------------ Stats ------------------
+@app.route("/api/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "ocr_batcher": ocr_batcher.stats(),
+        "image_preprocessing": image_preprocessor.stats(),
+        "llm": llm.stats(),
+        "prompts": prompt_builder.stats(),
+        "question_bank": question_bank.stats(),
+        "llm_json": llm_json.stats(),
+        "result_cache": result_cache.stats(),
+        "single_flight": in_flight.stats(),
+        "jobs": job_manager.stats()
+    })
 
 # ------------------ Static File Serving ------------------
 @app.route("/")
@@ -1188,7 +2092,11 @@ def home():
 
 @app.route("/<path:path>")
 def static_files(path):
+    # Never serve dotfiles or dot-directories (.env, .git, local data)
+    if any(part.startswith(".") for part in path.replace("\\", "/").split("/")):
+        return jsonify({"error": "Not found"}), 404
     return send_from_directory(".", path)
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # Development server only; use `python serve.py` (gunicorn) in production
+    app.run(debug=True, port=int(os.getenv("PORT", "5000")))
\ No newline at end of file
@@ -0,0 +1,155 @@
+import copy
+import threading
+
+from tracing import tracer
+
+
+class _Waiter:
+    """A caller of a shared call, with its progress listener and the error that listener raised"""
+
+    __slots__ = ("listener", "error")
+
+    def __init__(self, listener):
+        self.listener = listener
+        self.error = None
+
+
+class _Call:
+    """One upstream call in progress, its callers, and its outcome once finished"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.finished = False
+        self.aborted = False
+        self.result = None
+        self.error = None
+        self.waiters = []
+        self.last_progress = None
+        self.abort_error = None
+
+    def report(self, *args, **kwargs):
+        """Pass progress on to every caller's listener.
+
+        A listener that raises (e.g. JobCancelled) detaches only its own
+        caller. The work itself is aborted, by raising that error here, only
+        once no caller is left waiting for the result.
+        """
+        with self.cond:
+            self.last_progress = (args, kwargs)
+            waiters = [waiter for waiter in self.waiters if waiter.listener]
+        for waiter in waiters:
+            self.notify(waiter, args, kwargs)
+        if self.aborted:
+            raise self.abort_error
+
+    def notify(self, waiter, args, kwargs):
+        """Call one caller's listener, detaching the caller if it raises"""
+        try:
+            waiter.listener(*args, **kwargs)
+        except Exception as e:
+            with self.cond:
+                waiter.error = e
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                if not self.waiters:
+                    self.aborted = True
+                    self.abort_error = e
+                self.cond.notify_all()
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one upstream call.
+
+    The first caller for a key runs the work; callers arriving while it is
+    in progress wait for it and get a copy of its result, or its exception.
+    Nothing is kept once the call finishes, so later callers run again (or
+    hit the result cache). Keys are result cache keys, and the stage at the
+    start of a key is used to break the counts down in stats().
+
+    With progress=True, func is called with on_progress=<callback> and each
+    caller's listener gets the progress of the shared call. A caller whose
+    listener raises stops waiting with that error without failing the
+    others; if it was the last one, the shared call is abandoned and anyone
+    who joined it meanwhile starts it again.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {}
+
+    def run(self, key, func, *args, progress=False, listener=None, **kwargs):
+        """func(*args, **kwargs), shared with concurrent callers using the same key"""
+        if not self.enabled:
+            if progress:
+                kwargs["on_progress"] = listener
+            return func(*args, **kwargs)
+
+        stage = key.split(":", 1)[0]
+        waiter = _Waiter(listener)
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                with call.cond:
+                    call.waiters.append(waiter)
+                    last_progress = call.last_progress
+                self._count(stage, "calls" if leader else "coalesced")
+
+            if leader:
+                if progress:
+                    kwargs["on_progress"] = call.report
+                return self._lead(key, call, waiter, func, args, kwargs)
+
+            if listener is not None and last_progress is not None:
+                # Bring a caller that joined late up to date
+                call.notify(waiter, *last_progress)
+            with tracer.span(f"single_flight.{stage}"):
+                with call.cond:
+                    call.cond.wait_for(lambda: call.finished or waiter.error is not None)
+            if waiter.error is not None:
+                raise waiter.error
+            if call.aborted:
+                # Everyone else gave up on that call; start it again
+                self._count(stage, "restarted")
+                continue
+            if call.error is not None:
+                raise call.error
+            # Callers may modify what they get back, so followers get their own copy
+            return copy.deepcopy(call.result)
+
+    def stats(self):
+        with self._lock:
+            report = {stage: dict(stats) for stage, stats in self._stats.items()}
+            in_flight = len(self._calls)
+        for stats in report.values():
+            requests = stats["calls"] + stats["coalesced"]
+            stats["dedup_rate"] = round(stats["coalesced"] / requests, 3) if requests else 0.0
+        return {"in_flight": in_flight, "stages": report}
+
+    def _lead(self, key, call, waiter, func, args, kwargs):
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            with call.cond:
+                call.finished = True
+                call.cond.notify_all()
+        # The leader's own listener may have given up while the work went on for the others
+        if waiter.error is not None:
+            raise waiter.error
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _count(self, stage, name):
+        stats = self._stats.get(stage)
+        if stats is None:
+            stats = self._stats[stage] = {"calls": 0, "coalesced": 0, "restarted": 0}
+        stats[name] += 1
@@ -0,0 +1,86 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Stage:
+    """A pipeline step: func receives a dict of its dependencies' results"""
+
+    def __init__(self, name, func, deps=(), timeout=None, fallback=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+def run_stage_graph(stages, max_workers=None, on_stage_done=None):
+    """Run stages concurrently as soon as their dependencies finish.
+
+    A stage that raises or exceeds its timeout is replaced by its fallback
+    (called with the same inputs) so dependents can still run. Returns the
+    results by stage name and a per-stage report of status and duration.
+    on_stage_done(name, status) is called from this thread as stages finish.
+    """
+    remaining = {stage.name: stage for stage in stages}
+    results = {}
+    report = {}
+    running = {}  # future -> (stage, inputs, started_at)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(remaining) or 1)
+    try:
+        while remaining or running:
+            for name, stage in list(remaining.items()):
+                if all(dep in results for dep in stage.deps):
+                    inputs = {dep: results[dep] for dep in stage.deps}
+                    # Run in a copy of the caller's context so request-scoped state (tracing) follows
+                    future = executor.submit(contextvars.copy_context().run, stage.func, inputs)
+                    running[future] = (stage, inputs, time.monotonic())
+                    del remaining[name]
+
+            if not running:
+                raise Exception(f"Unresolvable stage dependencies: {', '.join(sorted(remaining))}")
+
+            now = time.monotonic()
+            deadlines = [
+                started_at + stage.timeout - now
+                for stage, _, started_at in running.values()
+                if stage.timeout is not None
+            ]
+            wait_timeout = max(0, min(deadlines)) if deadlines else None
+            done, _ = wait(list(running), timeout=wait_timeout, return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future in list(running):
+                stage, inputs, started_at = running[future]
+                if future in done:
+                    del running[future]
+                    try:
+                        results[stage.name] = future.result()
+                        status = "ok"
+                    except Exception as e:
+                        results[stage.name] = _run_fallback(stage, inputs, e)
+                        status = "fallback"
+                elif stage.timeout is not None and now - started_at >= stage.timeout:
+                    # The worker thread cannot be interrupted; its late result is discarded
+                    del running[future]
+                    future.cancel()
+                    results[stage.name] = _run_fallback(
+                        stage, inputs, TimeoutError(f"Stage '{stage.name}' timed out after {stage.timeout}s")
+                    )
+                    status = "timeout"
+                else:
+                    continue
+                report[stage.name] = {"status": status, "seconds": round(time.monotonic() - started_at, 4)}
+                if on_stage_done:
+                    on_stage_done(stage.name, status)
+    finally:
+        executor.shutdown(wait=False)
+
+    return results, report
+
+
+def _run_fallback(stage, inputs, error):
+    if stage.fallback is None:
+        raise error
+    return stage.fallback(inputs)
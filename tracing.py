@@ -0,0 +1,204 @@
+import contextvars
+import functools
+import threading
+import time
+
+# Per-request span totals (name -> [seconds, count]) used for Server-Timing
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Span:
+    """Times a block of work; numeric attributes (bytes, tokens, ...) are summed per span name"""
+
+    __slots__ = ("tracer", "name", "attrs", "started")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._record(self.name, time.perf_counter() - self.started, self.attrs, exc_type is not None)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Lightweight span timing with Prometheus text exposition.
+
+    When disabled, span() hands back a shared no-op object so instrumented
+    code pays only an attribute lookup and a method call.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS, prefix="ylearn"):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._spans = {}  # name -> {"duration": Histogram, "errors": int, "attrs": {attr: total}}
+        self._requests = {}  # (method, endpoint, status) -> Histogram
+
+    def span(self, name, **attrs):
+        """Context manager timing the enclosed block as `name`"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def traced(self, name):
+        """Decorator form of span()"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ---- per-request traces ----
+
+    def start_trace(self):
+        """Begin collecting span totals for the current request context"""
+        _current_trace.set({} if self.enabled else None)
+
+    def end_trace(self):
+        """Stop collecting and return {span name: [seconds, count]} for the request"""
+        trace = _current_trace.get()
+        _current_trace.set(None)
+        return trace or {}
+
+    def observe_request(self, method, endpoint, status, seconds):
+        if not self.enabled:
+            return
+        key = (method, endpoint or "unknown", str(status))
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    # ---- exposition ----
+
+    def render_prometheus(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            spans = sorted(self._spans.items())
+            requests = sorted(self._requests.items())
+
+            name = f"{self.prefix}_span_duration_seconds"
+            lines.append(f"# HELP {name} Time spent in traced pipeline stages")
+            lines.append(f"# TYPE {name} histogram")
+            for span_name, data in spans:
+                lines.extend(self._render_histogram(name, {"span": span_name}, data["duration"]))
+
+            name = f"{self.prefix}_span_errors_total"
+            lines.append(f"# HELP {name} Traced stages that raised")
+            lines.append(f"# TYPE {name} counter")
+            for span_name, data in spans:
+                lines.append(f'{name}{{span="{span_name}"}} {data["errors"]}')
+
+            attr_names = sorted({attr for _, data in spans for attr in data["attrs"]})
+            for attr in attr_names:
+                name = f"{self.prefix}_span_{attr}_total"
+                lines.append(f"# HELP {name} Sum of the {attr} recorded on traced stages")
+                lines.append(f"# TYPE {name} counter")
+                for span_name, data in spans:
+                    if attr in data["attrs"]:
+                        lines.append(f'{name}{{span="{span_name}"}} {_format_number(data["attrs"][attr])}')
+
+            name = f"{self.prefix}_http_request_duration_seconds"
+            lines.append(f"# HELP {name} HTTP request latency by endpoint")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, endpoint, status), histogram in requests:
+                labels = {"method": method, "endpoint": endpoint, "status": status}
+                lines.extend(self._render_histogram(name, labels, histogram))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def server_timing(trace):
+        """Format a request trace as a Server-Timing header value"""
+        return ", ".join(
+            f'{name};dur={seconds * 1000:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+            for name, (seconds, count) in trace.items()
+        )
+
+    def _render_histogram(self, name, labels, histogram):
+        label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+        lines = [
+            f'{name}_bucket{{{label_text},le="{_format_number(bound)}"}} {count}'
+            for bound, count in zip(histogram.buckets, histogram.counts)
+        ]
+        lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{label_text}}} {_format_number(histogram.sum)}")
+        lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+        return lines
+
+    def _record(self, name, seconds, attrs, failed):
+        with self._lock:
+            data = self._spans.get(name)
+            if data is None:
+                data = self._spans[name] = {"duration": Histogram(self.buckets), "errors": 0, "attrs": {}}
+            data["duration"].observe(seconds)
+            if failed:
+                data["errors"] += 1
+            for attr, value in attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    data["attrs"][attr] = data["attrs"].get(attr, 0) + value
+
+        trace = _current_trace.get()
+        if trace is not None:
+            with self._lock:
+                totals = trace.setdefault(name, [0.0, 0])
+                totals[0] += seconds
+                totals[1] += 1
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Process-wide tracer shared by the server and its pipeline modules
+tracer = Tracer()